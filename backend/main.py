@@ -18,7 +18,7 @@ import uuid
 from datetime import datetime, timedelta
 import os
 from pathlib import Path
-from services.stripe_service import StripeService
+from services.stripe_service import get_stripe_service
 from contextlib import asynccontextmanager
 import config
 
@@ -43,7 +43,7 @@ def init_stripe_service():
     """Initialisiert den Stripe Service bei Serverstart"""
     global stripe_service
     try:
-        stripe_service = StripeService()
+        stripe_service = get_stripe_service()
         logger.info("Stripe Service erfolgreich initialisiert")
     except Exception as e:
         logger.warning(f"Stripe Service konnte nicht initialisiert werden: {e}")
@@ -641,7 +641,7 @@ async def get_analysis_status(job_id: str):
                 # Hole auch die Ergebnisse, falls die Analyse abgeschlossen ist
                 if job_status["status"] == "completed":
                     try:
-                        results = supabase.get_job_results(job_id)
+                        results = await supabase.get_job_results_async(job_id)
                         logger.info(f"📋 Job {job_id} Ergebnisse geladen")
                         return AnalysisStatus(
                             job_id=job_id,
@@ -703,7 +703,7 @@ async def get_analysis_results(job_id: str):
             detail={"message": "Supabase-Service nicht verfügbar"}
         )
     
-    results = supabase.get_job_results(job_id)
+    results = await supabase.get_job_results_async(job_id)
     if not results or not results.get("job"):
         raise HTTPException(
             status_code=404,
@@ -733,7 +733,7 @@ async def get_jobs(limit: int = 10, offset: int = 0, x_user_id: Optional[str] =
     try:
         if x_user_id:
             # Hole nur Jobs des spezifischen Users
-            return supabase.get_user_jobs(x_user_id, limit, offset)
+            return await supabase.get_user_jobs_async(x_user_id, limit, offset)
         else:
             # Hole alle Jobs (Admin-Ansicht)
             response = supabase.client.table('analysis_jobs').select('*').order('created_at', desc=True).range(offset, offset + limit - 1).execute()
@@ -1049,7 +1049,7 @@ async def download_pdf(job_id: str):
             )
         
         # Hole Job-Daten und Module aus Supabase
-        results = supabase.get_job_results(job_id)
+        results = await supabase.get_job_results_async(job_id)
         if not results or not results.get("job"):
             raise HTTPException(
                 status_code=404,
@@ -1224,7 +1224,7 @@ async def create_payment_session(request: PaymentRequest):
             "created_at": datetime.now().isoformat()
         }
         
-        session_data = stripe_service.create_checkout_session(
+        session_data = await stripe_service.create_checkout_session_async(
             plan_id=request.plan_id,
             price_amount=request.price_amount,
             url=request.website_url,
@@ -1265,7 +1265,7 @@ async def validate_coupon(request: CouponValidationRequest):
         )
     
     try:
-        result = stripe_service.validate_coupon(request.coupon_code)
+        result = await stripe_service.validate_coupon_async(request.coupon_code)
         return result
         
     except Exception as e:
@@ -1331,7 +1331,7 @@ async def stripe_webhook(request: Request):
         raise HTTPException(status_code=400, detail="Missing stripe-signature header")
         
     try:
-        event = stripe_service.construct_webhook_event(payload, sig_header)
+        event = stripe_service.construct_webhook_event(memoryview(payload), sig_header)
         logger.info(f"✅ Stripe Webhook Event empfangen: {event['type']}")
         logger.info(f"🔍 Event Data: {json.dumps(event, indent=2, default=str)}")
     except Exception as e:
@@ -1340,6 +1340,14 @@ async def stripe_webhook(request: Request):
 
     # Nur auf erfolgreiche Checkout-Sessions reagieren
     if event['type'] == 'checkout.session.completed':
+        # Stripe stellt Events mehrfach zu - jede Event-ID nur einmal verarbeiten.
+        # Der In-Process-Check spart den DB-Request bei Wiederholungen an denselben Worker,
+        # verbindlich (über Prozesse/Serverless-Instanzen hinweg) ist der Eintrag in Supabase
+        if not stripe_service.mark_event_processed(event['id']) or \
+                not await SupabaseService().claim_webhook_event_async(event['id'], event['type']):
+            logger.info(f"⏭️ Event {event['id']} bereits verarbeitet - überspringe Duplikat")
+            return {"status": "duplicate event ignored"}
+        
         session = event['data']['object']
         metadata = session.get('metadata', {})
         
@@ -1594,6 +1602,8 @@ async def stripe_webhook(request: Request):
         except Exception as e:
             logger.error(f"Fehler bei der Verarbeitung des Webhooks und Start der Analyse: {e}")
             # Einen Fehler an Stripe zurückgeben, damit der Webhook erneut versucht wird
+            stripe_service.unmark_event_processed(event['id'])
+            await SupabaseService().release_webhook_event_async(event['id'])
             raise HTTPException(status_code=500, detail=f"Webhook-Verarbeitung fehlgeschlagen: {e}")
     else:
         logger.info(f"⏭️ Überspringe Event Type: {event['type']} (erwarten checkout.session.completed)")
@@ -7,6 +7,7 @@ Automatische Analyse aller WCAG-Bereiche mit ChatGPT-4
 import logging
 import json
 import os
+import re
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional
@@ -391,6 +392,9 @@ class CompleteWCAGAnalyzer:
         # Ergebnisse für jeden WCAG-Bereich (sequenziell)
         results = {}
         
+        # Modul-Ergebnisse/-Fehler für Supabase sammeln und am Ende gebündelt speichern
+        module_rows: List[Dict[str, Any]] = []
+        
         # Fortschritt berechnen
         total_areas = len(self.wcag_areas)
         progress_per_area = 68 / total_areas  # 68% für AI-Analysen (22-90%)
@@ -497,24 +501,20 @@ class CompleteWCAGAnalyzer:
                                 self.logger.error(f"Fehler beim Parsen von analysis_content für {wcag_area}: {json_err}")
                                 analysis_content_json = {"error": "Konnte AI Antwort nicht parsen"}
 
-                            self.supabase.save_module_result(
-                                job_id=self.job_id,
-                                module_name=wcag_area,
-                                result=analysis_content_json,
-                                token_usage=total_tokens,
-                                user_id=self.user_id
-                            )
+                            module_rows.append({
+                                'module_name': wcag_area,
+                                'result': analysis_content_json,
+                                'token_usage': total_tokens
+                            })
                             
-                            self.logger.info(f"💾 ROHDATEN-Ergebnis für {wcag_area} in Supabase gespeichert")
+                            self.logger.info(f"💾 ROHDATEN-Ergebnis für {wcag_area} zum Speichern vorgemerkt")
                     else:
                         self.logger.error(f"❌ ROHDATEN-Analyse fehlgeschlagen für {wcag_area}: {single_analysis_result.get('error')}")
                         if self.job_id:
-                            self.supabase.save_module_error(
-                                job_id=self.job_id,
-                                module_name=wcag_area,
-                                error=single_analysis_result.get('error', 'Unbekannter Analysefehler'),
-                                user_id=self.user_id
-                            )
+                            module_rows.append({
+                                'module_name': wcag_area,
+                                'error': single_analysis_result.get('error', 'Unbekannter Analysefehler')
+                            })
                 else:
                     self.logger.error(f"❌ Keine Ergebnisse für {wcag_area}")
                     results[wcag_area] = {
@@ -523,12 +523,10 @@ class CompleteWCAGAnalyzer:
                         "error": "Keine Ergebnisse von ROHDATEN-Analyse"
                     }
                     if self.job_id:
-                        self.supabase.save_module_error(
-                            job_id=self.job_id,
-                            module_name=wcag_area,
-                            error="Keine Ergebnisse von ROHDATEN-Analyse",
-                            user_id=self.user_id
-                        )
+                        module_rows.append({
+                            'module_name': wcag_area,
+                            'error': "Keine Ergebnisse von ROHDATEN-Analyse"
+                        })
                 
             except Exception as e:
                 self.logger.error(f"❌ Kritischer Fehler bei ROHDATEN-Analyse von {wcag_area}: {e}", exc_info=True)
@@ -538,20 +536,23 @@ class CompleteWCAGAnalyzer:
                     "error": str(e)
                 }
                 if self.job_id:
-                    self.supabase.save_module_error(
-                        job_id=self.job_id,
-                        module_name=wcag_area,
-                        error=str(e),
-                        user_id=self.user_id
-                    )
+                    module_rows.append({
+                        'module_name': wcag_area,
+                        'error': str(e)
+                    })
             
             current_progress += progress_per_area
         
+        # Alle Modul-Ergebnisse in einem Upsert speichern (vor mark_job_completed)
+        if self.job_id and module_rows:
+            self.supabase.save_module_results_bulk(self.job_id, module_rows, user_id=self.user_id)
+        
         self.logger.info(f"🏁 ROHDATEN-Analyse abgeschlossen - KEINE DATEN GEFILTERT!")
         return results
     
     def _create_comprehensive_summary(self, analysis_results: Dict[str, Any]) -> Dict[str, Any]:
         """Erstellt eine umfassende Zusammenfassung aller Analysen"""
+        overall_usage = analysis_results["token_usage"]
         
         # WCAG-Prinzipien gruppieren
         principles_summary = {}
@@ -571,11 +572,11 @@ class CompleteWCAGAnalyzer:
                 principles_summary[principle]["successful_analyses"] += 1
                 
                 # Sichere Token-Extraktion
-                token_usage = result.get("token_usage", {})
-                if isinstance(token_usage, dict):
-                    tokens = token_usage.get("total_tokens", 0)
+                module_usage = result.get("token_usage", {})
+                if isinstance(module_usage, dict):
+                    tokens = module_usage.get("total_tokens", 0)
                 else:
-                    tokens = token_usage if isinstance(token_usage, int) else 0
+                    tokens = module_usage if isinstance(module_usage, int) else 0
                     
                 principles_summary[principle]["total_tokens"] += tokens
                 principles_summary[principle]["areas"].append({
@@ -585,7 +586,7 @@ class CompleteWCAGAnalyzer:
         
         # Gesamtbewertung
         total_possible_analyses = len(self.wcag_areas)
-        successful_analyses = analysis_results["token_usage"]["successful_analyses"]
+        successful_analyses = overall_usage["successful_analyses"]
         completion_rate = (successful_analyses / total_possible_analyses) * 100 if total_possible_analyses > 0 else 0
         
         # Compliance Score berechnen (basierend auf Verstößen vs. erfolgreichen Checks)
@@ -620,7 +621,7 @@ class CompleteWCAGAnalyzer:
                 "violations": analysis_results["accessibility_check"]["violations"],
                 "warnings": analysis_results["accessibility_check"]["warnings"], 
                 "passed": analysis_results["accessibility_check"]["passed"],
-                "total_token_usage": analysis_results["token_usage"]["total_tokens"]
+                "total_token_usage": overall_usage["total_tokens"]
             },
             "recommendations": self._generate_priority_recommendations(analysis_results),
             "executive_summary": self._generate_executive_summary(analysis_results, conformance_level, compliance_score)
@@ -629,6 +630,7 @@ class CompleteWCAGAnalyzer:
     def _generate_priority_recommendations(self, analysis_results: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generiert prioritäre Empfehlungen basierend auf den Analysen"""
         recommendations = []
+        token_usage = analysis_results["token_usage"]
         
         # High-Priority: Viele Verstöße
         violations = analysis_results["accessibility_check"]["violations"]
@@ -641,7 +643,7 @@ class CompleteWCAGAnalyzer:
             })
         
         # Medium-Priority: Unvollständige AI-Analysen
-        failed_analyses = analysis_results["token_usage"]["failed_analyses"]
+        failed_analyses = token_usage["failed_analyses"]
         if failed_analyses > 0:
             recommendations.append({
                 "priority": "MEDIUM", 
@@ -651,7 +653,7 @@ class CompleteWCAGAnalyzer:
             })
         
         # Success: Hohe Completion Rate  
-        successful_analyses = analysis_results["token_usage"]["successful_analyses"]
+        successful_analyses = token_usage["successful_analyses"]
         total_possible_analyses = len(self.wcag_areas)
         completion_rate = (successful_analyses / total_possible_analyses) * 100 if total_possible_analyses > 0 else 0
         if completion_rate >= 80:
@@ -666,21 +668,22 @@ class CompleteWCAGAnalyzer:
     
     def _generate_executive_summary(self, analysis_results: Dict[str, Any], conformance_level: str, compliance_score: int) -> Dict[str, Any]:
         """Generiert eine Executive Summary"""
+        pages_crawled = analysis_results["crawling"]["pages_crawled"]
+        violations = analysis_results["accessibility_check"]["violations"]
+        total_tokens = f'{analysis_results["token_usage"]["total_tokens"]:,}'
         return {
             "headline": f"WCAG-Konformität: {conformance_level}",
             "score": compliance_score,
             "key_findings": [
-                f"{analysis_results['crawling']['pages_crawled']} Seiten analysiert",
-                f"{analysis_results['accessibility_check']['violations']} kritische Verstöße identifiziert",
-                f"{analysis_results['token_usage']['total_tokens']:,} AI-Token für detaillierte Analyse verwendet"
+                f"{pages_crawled} Seiten analysiert",
+                f"{violations} kritische Verstöße identifiziert",
+                f"{total_tokens} AI-Token für detaillierte Analyse verwendet"
             ],
             "next_steps": "Beheben Sie zuerst die kritischen technischen Verstöße"
         }
 
     def _extract_json_from_markdown(self, markdown_text: str) -> str:
         """Extrahiert JSON aus Markdown-Code-Blöcken (kopiert von OpenAI Analyzer)"""
-        import re
-        
         # Versuche JSON aus ```json Code-Blöcken zu extrahieren
         json_pattern = r'```json\s*\n(.*?)\n```'
         matches = re.findall(json_pattern, markdown_text, re.DOTALL)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Numba-Kernel für das WCAG-Scoring-System
+Kompiliert die Punkte-/Status-Zählung für große Kriterien-Batches zu nativem Code
+"""
+
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    # Fallback wenn numba nicht installiert ist - scoring_system nutzt dann NumPy
+    njit = None
+    _NUMBA_AVAILABLE = False
+
+# Status-Codes (identisch zu WCAGScoringSystem.STATUS_CODES)
+_PASSED = 0
+_FAILED = 1
+_PARTIAL = 2
+_WARNING = 3
+
+
+def _score_kernel_py(status_arr, severity_arr, severity_weights):
+    """
+    Summiert Punkte und zählt Status-Typen für kodierte Kriterien
+
+    Args:
+        status_arr: int8-Array mit Status-Codes (0=PASSED ... 4=UNKNOWN)
+        severity_arr: int8-Array mit Schweregrad-Codes (Index in severity_weights)
+        severity_weights: float64-Array mit Punktabzug je Schweregrad (0.0 - 1.0)
+
+    Returns:
+        Tuple (score_sum, passed, failed, partial, warnings)
+    """
+    score_sum = 0.0
+    passed = 0
+    failed = 0
+    partial = 0
+    warnings = 0
+
+    for i in range(status_arr.shape[0]):
+        status = status_arr[i]
+        if status == _PASSED:
+            score_sum += 100.0
+            passed += 1
+        elif status == _FAILED:
+            score_sum += max(0.0, 100.0 - severity_weights[severity_arr[i]] * 100.0)
+            failed += 1
+        elif status == _PARTIAL:
+            score_sum += 65.0
+            partial += 1
+        elif status == _WARNING:
+            score_sum += 65.0
+            warnings += 1
+        else:
+            score_sum += 30.0
+
+    return score_sum, passed, failed, partial, warnings
+
+
+# Explizite Signatur: Kompilierung beim Import statt beim ersten Request (cache=True lädt
+# den Maschinencode bei späteren Worker-Starts aus __pycache__)
+_SCORE_KERNEL_SIGNATURE = 'Tuple((float64, int64, int64, int64, int64))(int8[:], int8[:], float64[:])'
+
+if _NUMBA_AVAILABLE:
+    _score_kernel = njit(_SCORE_KERNEL_SIGNATURE, cache=True)(_score_kernel_py)
+else:
+    _score_kernel = None
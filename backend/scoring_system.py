@@ -4,10 +4,19 @@ Verbessertes WCAG-Scoring-System
 Einheitliche und benutzerfreundliche Bewertung der Barrierefreiheit
 """
 
+import bisect
 import logging
-from typing import Dict, Any, List, Tuple
+import re
+from typing import Dict, Any, List, Tuple, Optional
 from enum import Enum
 
+import numpy as np
+
+try:
+    from .scoring_numba import _score_kernel, _NUMBA_AVAILABLE
+except ImportError:
+    from scoring_numba import _score_kernel, _NUMBA_AVAILABLE
+
 logger = logging.getLogger(__name__)
 
 class ComplianceLevel(Enum):
@@ -20,6 +29,58 @@ class ComplianceLevel(Enum):
 class WCAGScoringSystem:
     """Einheitliches WCAG-Scoring-System"""
     
+    # WCAG-ID-Präfix der Modul-Namen (z.B. "1_1_textalternativen") -> Prinzip
+    _PRINCIPLE_BY_PREFIX = {
+        '1_1': 'perceivable', '1_2': 'perceivable', '1_3': 'perceivable', '1_4': 'perceivable',
+        '2_1': 'operable', '2_2': 'operable', '2_3': 'operable', '2_4': 'operable',
+        '3_1': 'understandable', '3_2': 'understandable', '3_3': 'understandable',
+        '4_1': 'robust'
+    }
+    
+    # Fallback-Schlüsselwörter je Prinzip (Reihenfolge = Priorität bei Mehrfachtreffern)
+    _PRINCIPLE_KEYWORDS = (
+        ('perceivable', ('1_1', '1_2', '1_3', '1_4', 'perceivable', 'wahrnehmbar')),
+        ('operable', ('2_1', '2_2', '2_3', '2_4', 'operable', 'bedienbar')),
+        ('understandable', ('3_1', '3_2', '3_3', 'understandable', 'verständlich')),
+        ('robust', ('4_1', 'robust', 'kompatibel'))
+    )
+    
+    # Assessment-Texte je Score-Stufe (aufsteigend: NONE, PARTIAL, A, AA, AAA)
+    _ASSESSMENT_THRESHOLDS = (40, 65, 80, 98)
+    _ASSESSMENT_TEMPLATES = (
+        "Erhebliche Barrieren identifiziert. {failed} kritische Probleme verhindern eine gute Zugänglichkeit. Umfassende Überarbeitung empfohlen.",
+        "Barrierefreiheit teilweise umgesetzt. {failed} Probleme beeinträchtigen die Zugänglichkeit. Gezielte Verbesserungen empfohlen.",
+        "Gute Grundlage der Barrierefreiheit. {passed}/{total} Kriterien erfüllt. {failed} Probleme sollten für bessere Zugänglichkeit behoben werden.",
+        "Sehr gute Barrierefreiheit. {passed}/{total} Kriterien erfüllt, {failed} Probleme identifiziert. Solide AA-Konformität erreicht.",
+        "Perfektion erreicht! {passed}/{total} Kriterien vollständig erfüllt. Die Website entspricht höchsten WCAG-Standards."
+    )
+    
+    # Gesamtbewertungs-Texte mit strengeren Stufen
+    _OVERALL_ASSESSMENT_THRESHOLDS = (50, 75, 85, 95)
+    _OVERALL_ASSESSMENT_TEMPLATES = (
+        "Kritische Barrierefreiheit-Mängel. {failed} schwerwiegende Barrieren verhindern eine gute Zugänglichkeit. Sofortige und umfassende Überarbeitung dringend notwendig.",
+        "Barrierefreiheit unvollständig. {failed} kritische Probleme beeinträchtigen die Zugänglichkeit erheblich. Umfassende Verbesserungen erforderlich.",
+        "Solide Barrierefreiheit-Grundlage. {failed} wichtige Probleme sollten für bessere Zugänglichkeit behoben werden.",
+        "Sehr gute Barrierefreiheit. {passed}/{total_criteria} Kriterien erfüllt, {failed} Probleme in {module_count} Modulen identifiziert. Solide AA-Konformität.",
+        "Hervorragende Barrierefreiheit! {module_count} WCAG-Module analysiert, {passed}/{total_criteria} Kriterien erfüllt. Höchste Zugänglichkeits-Standards erreicht."
+    )
+    
+    # Vorlage für Score-Results (wird pro Ergebnis kopiert)
+    _RESULT_TEMPLATE = {
+        'score': 0.0,
+        'compliance_level': '',
+        'overall_assessment': '',
+        'details': None,
+        'scoring_version': '2.0'
+    }
+    
+    # Obergrenze für den Modul-Gewichtungs-Cache
+    _WEIGHT_CACHE_MAXSIZE = 256
+    
+    # Status-/Schweregrad-Codes für spaltenorientierte Kriterien (criteria_arrays)
+    STATUS_CODES = {'PASSED': 0, 'FAILED': 1, 'PARTIAL': 2, 'WARNING': 3, 'UNKNOWN': 4}
+    SEVERITY_CODES = {'CRITICAL': 0, 'MAJOR': 1, 'MODERATE': 2, 'MINOR': 3, 'UNKNOWN': 4}
+    
     def __init__(self):
         # Gewichtung der WCAG-Prinzipien (Summe = 100%)
         self.principle_weights = {
@@ -45,51 +106,62 @@ class WCAGScoringSystem:
             40: ComplianceLevel.PARTIAL, # PARTIAL: 40+ (Teilweise)
             0: ComplianceLevel.NONE
         }
+        
+        # Aufsteigende Stufen für die verzweigungsfreie Zuordnung: Index = Anzahl erreichter Thresholds
+        sorted_thresholds = sorted(self.compliance_thresholds.items())
+        self._level_thresholds = tuple(threshold for threshold, _ in sorted_thresholds[1:])
+        self._levels = tuple(level for _, level in sorted_thresholds)
+        
+        # Modul-Gewichtung: Präfix-Tabelle plus ein kompiliertes Muster je Prinzip als Fallback
+        self._prefix_to_weight = {
+            prefix: self.principle_weights[principle]
+            for prefix, principle in self._PRINCIPLE_BY_PREFIX.items()
+        }
+        self._keyword_patterns = tuple(
+            (re.compile('|'.join(map(re.escape, keywords))), self.principle_weights[principle])
+            for principle, keywords in self._PRINCIPLE_KEYWORDS
+        )
+        self._default_module_weight = 1.0 / len(self.principle_weights)
+        
+        # Memo für bereits aufgelöste Modul-Namen (wenige, sich wiederholende WCAG-Module)
+        self._weight_cache: Dict[str, float] = {}
+        
+        # Lookup-Tabellen für die vektorisierte Berechnung (Index = Code)
+        self._status_points = np.array([100.0, 0.0, 65.0, 65.0, 30.0])
+        self._severity_lut = np.array([
+            self.severity_weights.get(severity, 0.7)
+            for severity in sorted(self.SEVERITY_CODES, key=self.SEVERITY_CODES.get)
+        ])
+        self._penalty_lut = self._severity_lut * 100
     
     def calculate_module_score(self, criteria_evaluation: List[Dict[str, Any]], 
-                             wcag_principle: str = "") -> Dict[str, Any]:
+                             wcag_principle: str = "",
+                             criteria_arrays: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
         """
         Berechnet Score für ein einzelnes WCAG-Modul
         
         Args:
             criteria_evaluation: Liste der bewerteten Kriterien
             wcag_principle: WCAG-Prinzip (perceivable, operable, etc.)
+            criteria_arrays: Optional spaltenorientierte Kriterien mit den Keys
+                'status' und 'severity' (Codes aus STATUS_CODES / SEVERITY_CODES).
+                Wenn gesetzt, wird vektorisiert gerechnet und criteria_evaluation ignoriert.
             
         Returns:
             Dict mit Score, Compliance Level und Details
         """
-        if not criteria_evaluation:
+        if criteria_arrays is not None:
+            status_arr, severity_arr = criteria_arrays['status'], criteria_arrays['severity']
+        elif criteria_evaluation:
+            status_arr, severity_arr = self._encode_criteria(criteria_evaluation)
+        else:
             return self._create_score_result(0, ComplianceLevel.NONE, "Keine Kriterien bewertet")
         
-        total_criteria = len(criteria_evaluation)
-        score_sum = 0
-        
-        # Zähle verschiedene Status-Typen
-        passed = 0
-        failed = 0
-        partial = 0
-        warnings = 0
+        if len(status_arr) == 0:
+            return self._create_score_result(0, ComplianceLevel.NONE, "Keine Kriterien bewertet")
         
-        for criteria in criteria_evaluation:
-            status = criteria.get('status', 'UNKNOWN').upper()
-            
-            if status == 'PASSED':
-                score_sum += 100
-                passed += 1
-            elif status == 'FAILED':
-                # Berücksichtige Schweregrad
-                severity = criteria.get('severity', 'MAJOR').upper()
-                penalty = self.severity_weights.get(severity, 0.7) * 100
-                score_sum += max(0, 100 - penalty)  # Mindestens 0 Punkte
-                failed += 1
-            elif status in ['PARTIAL', 'WARNING']:
-                score_sum += 65  # Teilweise erfüllt = 65% (erhöht von 50%)
-                if status == 'PARTIAL':
-                    partial += 1
-                else:
-                    warnings += 1
-            else:
-                score_sum += 30  # Unbekannt = 30% (erhöht von 20%)
+        score_sum, passed, failed, partial, warnings, total_criteria = self._count_criteria_arrays(
+            status_arr, severity_arr)
         
         # Durchschnittsscore berechnen
         average_score = score_sum / total_criteria if total_criteria > 0 else 0
@@ -111,6 +183,49 @@ class WCAGScoringSystem:
             'total': total_criteria
         })
     
+    def _encode_criteria(self, criteria_evaluation: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Kodiert Status und Schweregrad der Kriterien einmalig als int8-Arrays (Struct-of-Arrays)"""
+        status_lookup = self.STATUS_CODES
+        severity_lookup = self.SEVERITY_CODES
+        unknown_status = status_lookup['UNKNOWN']
+        unknown_severity = severity_lookup['UNKNOWN']
+        
+        count = len(criteria_evaluation)
+        status_arr = np.fromiter(
+            (status_lookup.get(criteria.get('status', 'UNKNOWN').upper(), unknown_status)
+             for criteria in criteria_evaluation),
+            dtype=np.int8, count=count)
+        # Schweregrad wird (wie in der Punkteberechnung) nur bei FAILED ausgewertet -
+        # andere Kriterien dürfen z.B. severity=None enthalten
+        failed_status = status_lookup['FAILED']
+        severity_arr = np.fromiter(
+            (severity_lookup.get(criteria.get('severity', 'MAJOR').upper(), unknown_severity)
+             if status == failed_status else unknown_severity
+             for criteria, status in zip(criteria_evaluation, status_arr.tolist())),
+            dtype=np.int8, count=count)
+        return status_arr, severity_arr
+    
+    def _count_criteria_arrays(self, status_codes: np.ndarray,
+                               severity_codes: np.ndarray) -> Tuple[float, int, int, int, int, int]:
+        """Summiert Punkte und zählt Status-Typen vektorisiert für kodierte Kriterien"""
+        if _NUMBA_AVAILABLE:
+            status_codes = np.ascontiguousarray(status_codes, dtype=np.int8)
+            score_sum, passed, failed, partial, warnings = _score_kernel(
+                status_codes, np.ascontiguousarray(severity_codes, dtype=np.int8), self._severity_lut)
+            return float(score_sum), passed, failed, partial, warnings, int(status_codes.size)
+        
+        status_codes = np.asarray(status_codes)
+        severity_codes = np.asarray(severity_codes)
+        
+        # Fehlgeschlagene Kriterien: 100 minus Schweregrad-Abzug (mindestens 0 Punkte)
+        scores = np.where(status_codes == self.STATUS_CODES['FAILED'],
+                          np.maximum(0, 100 - self._penalty_lut[severity_codes]),
+                          self._status_points[status_codes])
+        
+        counts = np.bincount(status_codes, minlength=len(self.STATUS_CODES))
+        return (float(scores.sum()), int(counts[0]), int(counts[1]),
+                int(counts[2]), int(counts[3]), int(status_codes.size))
+    
     def _adjust_score_for_ux(self, raw_score: float, failed_count: int, total_count: int) -> float:
         """
         FAIRE Score-Anpassung für realistische und motivierende Bewertungen
@@ -151,12 +266,11 @@ class WCAGScoringSystem:
         if total_count > 0 and (failed_count / total_count) > 0.5:
             return ComplianceLevel.NONE
         
-        # Score-basierte Bestimmung
-        for threshold, level in sorted(self.compliance_thresholds.items(), reverse=True):
-            if score >= threshold:
-                return level
-        
-        return ComplianceLevel.NONE
+        # Score-basierte Bestimmung (PARTIAL, A, AA, AAA)
+        partial_min, a_min, aa_min, aaa_min = self._level_thresholds
+        # int(): bei np.float64-Scores liefern die Vergleiche np.bool_, deren Summe ein logisches ODER wäre
+        index = int(score >= partial_min) + int(score >= a_min) + int(score >= aa_min) + int(score >= aaa_min)
+        return self._levels[index]
     
     def _generate_assessment(self, score: float, compliance_level: ComplianceLevel, 
                            passed: int, failed: int, partial: int, warnings: int) -> str:
@@ -164,27 +278,18 @@ class WCAGScoringSystem:
         
         total = passed + failed + partial + warnings
         
-        if score >= 98:  # AAA - praktisch unerreichbar
-            return f"Perfektion erreicht! {passed}/{total} Kriterien vollständig erfüllt. Die Website entspricht höchsten WCAG-Standards."
-        elif score >= 80:  # AA - gesetzlicher Standard
-            return f"Sehr gute Barrierefreiheit. {passed}/{total} Kriterien erfüllt, {failed} Probleme identifiziert. Solide AA-Konformität erreicht."
-        elif score >= 65:  # A
-            return f"Gute Grundlage der Barrierefreiheit. {passed}/{total} Kriterien erfüllt. {failed} Probleme sollten für bessere Zugänglichkeit behoben werden."
-        elif score >= 40:  # PARTIAL
-            return f"Barrierefreiheit teilweise umgesetzt. {failed} Probleme beeinträchtigen die Zugänglichkeit. Gezielte Verbesserungen empfohlen."
-        else:  # NONE
-            return f"Erhebliche Barrieren identifiziert. {failed} kritische Probleme verhindern eine gute Zugänglichkeit. Umfassende Überarbeitung empfohlen."
+        index = bisect.bisect_right(self._ASSESSMENT_THRESHOLDS, score)
+        return self._ASSESSMENT_TEMPLATES[index].format(passed=passed, total=total, failed=failed)
     
     def _create_score_result(self, score: float, compliance_level: ComplianceLevel, 
                            assessment: str, details: Dict[str, int] = None) -> Dict[str, Any]:
         """Erstellt einheitliches Score-Result-Objekt"""
-        return {
-            'score': round(score, 1),
-            'compliance_level': compliance_level.value,
-            'overall_assessment': assessment,
-            'details': details or {},
-            'scoring_version': '2.0'
-        }
+        result = self._RESULT_TEMPLATE.copy()
+        result['score'] = round(score, 1)
+        result['compliance_level'] = compliance_level.value
+        result['overall_assessment'] = assessment
+        result['details'] = details or {}
+        return result
     
     def calculate_overall_score(self, module_scores: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -199,36 +304,38 @@ class WCAGScoringSystem:
         if not module_scores:
             return self._create_score_result(0, ComplianceLevel.NONE, "Keine Module bewertet")
         
-        weighted_score = 0
-        total_weight = 0
+        module_count = len(module_scores)
         
-        # Sammle Statistiken
-        total_passed = 0
-        total_failed = 0
-        total_partial = 0
-        total_warnings = 0
+        # Eine Zeile je Modul (Spalten: passed, failed, partial, warnings, score)
+        module_matrix = np.array([
+            [details.get('passed', 0), details.get('failed', 0),
+             details.get('partial', 0), details.get('warnings', 0),
+             module_result.get('score', 0)]
+            for module_result in module_scores.values()
+            for details in (module_result.get('details', {}),)
+        ], dtype=np.float64)
+        total_passed, total_failed, total_partial, total_warnings = (
+            int(value) for value in module_matrix[:, :4].sum(axis=0)
+        )
         
-        # Gewichtete Berechnung nach WCAG-Prinzipien
-        for module_name, module_result in module_scores.items():
-            # Bestimme Gewicht basierend auf Modul-Name
-            weight = self._get_module_weight(module_name)
-            module_score = module_result.get('score', 0)
-            
-            weighted_score += module_score * weight
-            total_weight += weight
-            
-            # Sammle Details
-            details = module_result.get('details', {})
-            total_passed += details.get('passed', 0)
-            total_failed += details.get('failed', 0)
-            total_partial += details.get('partial', 0)
-            total_warnings += details.get('warnings', 0)
-        
-        # Gesamtscore berechnen
-        if total_weight > 0:
-            final_score = weighted_score / total_weight
+        # Gesamtscore berechnen - schneller Pfad ohne Gewichtung, wenn kein Modul Punkte hat
+        if not module_matrix[:, 4].any():
+            final_score = 0.0
         else:
-            final_score = 0
+            # Gewichtung nach WCAG-Prinzipien (basierend auf Modul-Name) - bewusst als sequenzielle
+            # Python-Summe: np.dot summiert in anderer Reihenfolge und verschiebt sonst die Rundung
+            # gespeicherter Scores bei identischem Input
+            weighted_score = 0
+            total_weight = 0
+            for module_name, module_result in module_scores.items():
+                weight = self._get_module_weight(module_name.lower())
+                weighted_score += module_result.get('score', 0) * weight
+                total_weight += weight
+            
+            if total_weight > 0:
+                final_score = weighted_score / total_weight
+            else:
+                final_score = 0.0
         
         # Compliance Level für Gesamtbewertung
         total_criteria = total_passed + total_failed + total_partial + total_warnings
@@ -238,10 +345,10 @@ class WCAGScoringSystem:
         assessment = self._generate_overall_assessment(final_score, compliance_level, 
                                                      total_passed, total_failed, 
                                                      total_partial, total_warnings, 
-                                                     len(module_scores))
+                                                     module_count)
         
         return self._create_score_result(final_score, compliance_level, assessment, {
-            'total_modules': len(module_scores),
+            'total_modules': module_count,
             'passed': total_passed,
             'failed': total_failed,
             'partial': total_partial,
@@ -249,21 +356,34 @@ class WCAGScoringSystem:
             'total_criteria': total_criteria
         })
     
-    def _get_module_weight(self, module_name: str) -> float:
-        """Bestimmt Gewichtung eines Moduls basierend auf WCAG-Prinzip"""
+    def _get_module_weight(self, module_name_lower: str) -> float:
+        """
+        Bestimmt Gewichtung eines Moduls basierend auf WCAG-Prinzip
+        
+        Erwartet den bereits kleingeschriebenen Modul-Namen (Aufrufer normalisiert einmalig).
+        """
+        weight = self._weight_cache.get(module_name_lower)
+        if weight is None:
+            weight = self._compute_module_weight(module_name_lower)
+            if len(self._weight_cache) < self._WEIGHT_CACHE_MAXSIZE:
+                self._weight_cache[module_name_lower] = weight
+        return weight
+    
+    def _compute_module_weight(self, module_name_lower: str) -> float:
+        """Löst die Gewichtung eines (kleingeschriebenen) Modul-Namens ohne Cache auf"""
+        
+        # Schneller Pfad: Modul-Namen beginnen mit der WCAG-ID
+        weight = self._prefix_to_weight.get(module_name_lower[:3])
+        if weight is not None:
+            return weight
         
         # Mapping von Modul-Namen zu WCAG-Prinzipien
-        if any(x in module_name.lower() for x in ['1_1', '1_2', '1_3', '1_4', 'perceivable', 'wahrnehmbar']):
-            return self.principle_weights['perceivable']
-        elif any(x in module_name.lower() for x in ['2_1', '2_2', '2_3', '2_4', 'operable', 'bedienbar']):
-            return self.principle_weights['operable']
-        elif any(x in module_name.lower() for x in ['3_1', '3_2', '3_3', 'understandable', 'verständlich']):
-            return self.principle_weights['understandable']
-        elif any(x in module_name.lower() for x in ['4_1', 'robust', 'kompatibel']):
-            return self.principle_weights['robust']
-        else:
-            # Gleichmäßige Verteilung wenn nicht zuordenbar
-            return 1.0 / len(self.principle_weights)
+        for pattern, weight in self._keyword_patterns:
+            if pattern.search(module_name_lower):
+                return weight
+        
+        # Gleichmäßige Verteilung wenn nicht zuordenbar
+        return self._default_module_weight
     
     def _generate_overall_assessment(self, score: float, compliance_level: ComplianceLevel,
                                    passed: int, failed: int, partial: int, warnings: int,
@@ -272,16 +392,9 @@ class WCAGScoringSystem:
         
         total_criteria = passed + failed + partial + warnings
         
-        if score >= 95:  # AAA
-            return f"Hervorragende Barrierefreiheit! {module_count} WCAG-Module analysiert, {passed}/{total_criteria} Kriterien erfüllt. Höchste Zugänglichkeits-Standards erreicht."
-        elif score >= 85:  # AA
-            return f"Sehr gute Barrierefreiheit. {passed}/{total_criteria} Kriterien erfüllt, {failed} Probleme in {module_count} Modulen identifiziert. Solide AA-Konformität."
-        elif score >= 75:  # A
-            return f"Solide Barrierefreiheit-Grundlage. {failed} wichtige Probleme sollten für bessere Zugänglichkeit behoben werden."
-        elif score >= 50:  # PARTIAL
-            return f"Barrierefreiheit unvollständig. {failed} kritische Probleme beeinträchtigen die Zugänglichkeit erheblich. Umfassende Verbesserungen erforderlich."
-        else:  # NONE
-            return f"Kritische Barrierefreiheit-Mängel. {failed} schwerwiegende Barrieren verhindern eine gute Zugänglichkeit. Sofortige und umfassende Überarbeitung dringend notwendig."
+        index = bisect.bisect_right(self._OVERALL_ASSESSMENT_THRESHOLDS, score)
+        return self._OVERALL_ASSESSMENT_TEMPLATES[index].format(
+            passed=passed, total_criteria=total_criteria, failed=failed, module_count=module_count)
 
 # Globale Instanz für einheitliche Nutzung
 wcag_scorer = WCAGScoringSystem() 
\ No newline at end of file
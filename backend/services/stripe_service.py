@@ -1,28 +1,410 @@
-import stripe
 import os
+import re
+import json
+import asyncio
+import hashlib
+import hmac
+import time
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Callable, List, Mapping, Optional, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import stripe
+
+try:
+    import orjson
+except ImportError:
+    # Fallback auf die Standardbibliothek wenn orjson nicht installiert ist
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Ablauf einer Checkout Session nach Erstellung (30 Minuten) in Sekunden
+_EXPIRES_SECONDS = 30 * 60
+
+# Mehrwertsteuersatz in Prozent (19% MwSt)
+VAT_PERCENT = 19
+
+
+def _split_net_vat(gross: int) -> Tuple[int, int]:
+    """Teilt einen Bruttobetrag in Cent ganzzahlig in (Netto, MwSt) auf"""
+    net = gross * 100 // (100 + VAT_PERCENT)
+    return net, gross - net
+
+# Produkt-Namen der Standard-Analysen (basic/enterprise)
+_PRODUCT_NAMES = MappingProxyType({
+    "basic": "WCAG Basic Analyse",
+    "enterprise": "WCAG Enterprise Analyse (inkl. Zertifikat)"
+})
+
+def _checkout_idempotency_key(user_id: str, plan_id: str, price_amount: int, url: str,
+                              coupon_code: Optional[str], request_minute: int) -> str:
+    """Stabiler Idempotency-Key für Session.create aus den fachlichen Checkout-Daten"""
+    raw = f"{user_id}|{plan_id}|{price_amount}|{url}|{coupon_code or ''}|{request_minute}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+# Text-Vorlagen für Line Items und Rechnung
+_NET_NAME_FMT = '{name} (netto)'
+_VAT_DESCRIPTION_FMT = 'Gesetzliche Mehrwertsteuer auf {name}'
+_INVOICE_DESCRIPTION_FMT = 'Barrierefreiheits-Services: {url}'
+
+# Line-Item-Spezifikation je Plan: Produkt-Name und Beschreibung des Netto-Postens.
+# Standard-Analysen (basic/enterprise und unbekannte Pläne) können zusätzlich Upgrades enthalten.
+PLAN_SPEC = MappingProxyType({
+    'certificate_only': MappingProxyType({
+        'name': 'Offizielles Zertifikat',
+        'description_fmt': 'Rechtswirksames Zertifikat vom vitium e.V. für {url}',
+        'with_upgrades': False
+    }),
+    'professional_fix': MappingProxyType({
+        'name': 'Professionelle Website-Überarbeitung',
+        'description_fmt': 'Vollständige Code-Überarbeitung durch zertifizierten Barrierefreiheitsexperten für {url} ({page_count} Seiten)',
+        'with_upgrades': False
+    }),
+    **{
+        plan_id: MappingProxyType({
+            'name': product_name,
+            'description_fmt': 'Barrierefreiheits-Analyse für {url}',
+            'with_upgrades': True,
+            # Bei Enterprise ist Zertifikat bereits im Preis enthalten
+            'included_upgrades': ('certificate',) if plan_id == 'enterprise' else ()
+        })
+        for plan_id, product_name in _PRODUCT_NAMES.items()
+    }
+})
+_DEFAULT_PLAN_SPEC = MappingProxyType({
+    'name': 'WCAG Analyse',
+    'description_fmt': 'Barrierefreiheits-Analyse für {url}',
+    'with_upgrades': True,
+    'included_upgrades': ()
+})
+
+# Upgrade-Namen und Preise (netto in Cent)
+_UPGRADE_INFO = MappingProxyType({
+    'professional_fix': MappingProxyType({
+        'name': 'Professionelle Website-Überarbeitung',
+        'description': 'Vollständige Code-Überarbeitung durch zertifizierten Barrierefreiheitsexperten',
+        'price_net': 200000  # €2000 netto in Cent
+    }),
+    'certificate': MappingProxyType({
+        'name': 'Offizielles Zertifikat',
+        'description': 'Rechtswirksames Zertifikat vom vitium e.V. - geprüft von Menschen mit Behinderungen',
+        'price_net': 90000   # €900 netto in Cent
+    })
+})
+
+
+def _append_net_vat_pair(line_items: List[Dict[str, Any]], currency: str, name: str,
+                         description: str, net_amount: int, vat_amount: int) -> None:
+    """Hängt je ein Line Item für den Netto-Betrag und die MwSt eines Produkts an"""
+    line_items.append({
+        'price_data': {
+            'currency': currency,
+            'product_data': {
+                'name': _NET_NAME_FMT.format(name=name),
+                'description': description,
+            },
+            'unit_amount': net_amount,
+        },
+        'quantity': 1,
+    })
+    line_items.append({
+        'price_data': {
+            'currency': currency,
+            'product_data': {
+                'name': '19% Mehrwertsteuer',
+                'description': _VAT_DESCRIPTION_FMT.format(name=name),
+            },
+            'unit_amount': vat_amount,
+        },
+        'quantity': 1,
+    })
+
+
+def _make_plan_builder(spec: Mapping[str, Any]) -> Callable[..., List[Dict[str, Any]]]:
+    """
+    Erzeugt einen auf einen Plan spezialisierten Line-Item-Builder
+    
+    Name, Beschreibungs-Vorlage und Upgrade-Regeln werden einmalig aus der Spezifikation
+    gelesen und im Closure gebunden, pro Checkout läuft nur noch der Builder selbst.
+    """
+    name = spec['name']
+    description_fmt = spec['description_fmt']
+    with_upgrades = spec.get('with_upgrades', False)
+    included_upgrades = frozenset(spec.get('included_upgrades', ()))
+    
+    def build(price_amount: int, url: str, upgrade_details: Optional[Dict[str, Any]],
+              currency: str) -> List[Dict[str, Any]]:
+        page_count = upgrade_details.get('detected_pages', 1) if upgrade_details else 1
+        
+        line_items: List[Dict[str, Any]] = []
+        net_amount, vat_amount = _split_net_vat(price_amount)
+        _append_net_vat_pair(line_items, currency, name,
+                             description_fmt.format(url=url, page_count=page_count),
+                             net_amount, vat_amount)
+        logger.debug("%s: Netto €%s, MwSt €%s, Gesamt €%s", name, net_amount / 100, vat_amount / 100, price_amount / 100)
+        
+        # Füge separate Line Items für Upgrades hinzu (falls vorhanden)
+        if with_upgrades and upgrade_details and upgrade_details.get('selected_upgrades'):
+            logger.debug("Füge Upgrades hinzu zu %s: %s", name, upgrade_details)
+            selected_upgrades = upgrade_details.get('selected_upgrades', [])
+            
+            # Im Plan enthaltene Upgrades nicht nochmal berechnen!
+            if included_upgrades.intersection(selected_upgrades):
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("%s: %s bereits im Preis enthalten - überspringe separate Berechnung",
+                                 name, ', '.join(sorted(included_upgrades)))
+                selected_upgrades = [u for u in selected_upgrades if u not in included_upgrades]
+            
+            for upgrade_id in selected_upgrades:
+                upgrade = _UPGRADE_INFO.get(upgrade_id)
+                if upgrade is None:
+                    continue
+                net_upgrade_amount = upgrade['price_net']
+                vat_upgrade_amount = (net_upgrade_amount * VAT_PERCENT) // 100
+                _append_net_vat_pair(line_items, currency, upgrade['name'], upgrade['description'],
+                                     net_upgrade_amount, vat_upgrade_amount)
+                logger.debug("Upgrade hinzugefügt: %s - Netto €%s, MwSt €%s",
+                             upgrade['name'], net_upgrade_amount / 100, vat_upgrade_amount / 100)
+        
+        return line_items
+    
+    return build
+
+
+# Vorab spezialisierte Builder je Plan
+_PLAN_BUILDERS = MappingProxyType({plan_id: _make_plan_builder(spec) for plan_id, spec in PLAN_SPEC.items()})
+_DEFAULT_PLAN_BUILDER = _make_plan_builder(_DEFAULT_PLAN_SPEC)
+
+
+def _build_line_items(plan_id: str, price_amount: int, url: str,
+                      upgrade_details: Optional[Dict[str, Any]], currency: str) -> List[Dict[str, Any]]:
+    """
+    Baut die Line Items einer Checkout Session über den Builder des Plans
+    
+    Der Gesamtpreis wird in Netto und MwSt aufgeteilt; bei Standard-Analysen kommen
+    separate Netto/MwSt-Posten für gebuchte Upgrades hinzu.
+    """
+    return _PLAN_BUILDERS.get(plan_id, _DEFAULT_PLAN_BUILDER)(price_amount, url, upgrade_details, currency)
+
+# HTTP-Verbindungspool für Stripe-API-Calls
+STRIPE_POOL_CONNECTIONS = 20
+STRIPE_POOL_MAXSIZE = 50
+STRIPE_HTTP_TIMEOUT = 30
+
+# Test-Preise für create_test_mode_prices (nur Entwicklung)
+_TEST_MODE_PRICES = MappingProxyType({
+    'basic': {
+        'unit_amount': 35000,  # €350.00
+        'currency': 'eur',
+        'product_data': {
+            'name': 'WCAG Basic Analyse',
+            'description': 'Grundlegende Barrierefreiheits-Analyse'
+        },
+    },
+    'enterprise': {
+        'unit_amount': 45000,  # €450.00
+        'currency': 'eur',
+        'product_data': {
+            'name': 'WCAG Enterprise Analyse',
+            'description': 'Umfassende Barrierefreiheits-Analyse mit Premium-Features'
+        },
+    },
+})
+
+# Maximale Anzahl paralleler Stripe-Calls pro Worker aus den async-Wrappern
+STRIPE_MAX_CONCURRENCY = 20
+
+# Wiederholungen bei Verbindungsfehlern/5xx übernimmt das Stripe-SDK selbst
+# (exponentielles Backoff mit Jitter, POSTs automatisch mit Idempotency-Key)
+STRIPE_MAX_NETWORK_RETRIES = 2
+
+# Bereits verarbeitete Webhook-Event-IDs (Stripe stellt Events at-least-once zu und
+# wiederholt Zustellungen bis zu 3 Tage lang): event_id -> Ablaufzeit
+# Nur ein Schnellpfad pro Prozess - verbindlich ist stripe_webhook_events in Supabase
+# (SupabaseService.claim_webhook_event), da jeder Worker/Serverless-Prozess ein eigenes Dict hat
+WEBHOOK_EVENT_TTL = 259200
+WEBHOOK_EVENT_CACHE_MAXSIZE = 4096
+_processed_event_ids: Dict[str, float] = {}
+_processed_event_ids_lock = threading.Lock()
+
+# Circuit Breaker: nach STRIPE_BREAKER_FAILURE_THRESHOLD aufeinanderfolgenden Verbindungs-/
+# Serverfehlern werden Stripe-Calls für STRIPE_BREAKER_RESET_TIMEOUT Sekunden sofort abgelehnt
+STRIPE_BREAKER_FAILURE_THRESHOLD = 5
+STRIPE_BREAKER_RESET_TIMEOUT = 30
+_breaker_state = {'failures': 0, 'open_until': 0.0}
+_breaker_lock = threading.Lock()
+
+# Cache für Stripe-Coupons: coupon_code -> (Ablaufzeit, Coupon oder None für unbekannte Codes)
+# Unbekannte Codes nur kurz cachen, damit neu angelegte Coupons schnell sichtbar werden
+COUPON_CACHE_TTL = 300
+COUPON_CACHE_NEGATIVE_TTL = 30
+COUPON_CACHE_MAXSIZE = 512
+# Erlaubtes Format für Coupon-IDs - alles andere kann bei Stripe nicht existieren
+_COUPON_CODE_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+_coupon_cache: Dict[str, Tuple[float, Any]] = {}
+_coupon_cache_lock = threading.Lock()
+
+# Bereits als bezahlt verifizierte Session-IDs (Endzustand, daher ohne Ablaufzeit)
+PAID_SESSION_CACHE_MAXSIZE = 1024
+_paid_session_ids: Dict[str, bool] = {}
+_paid_session_ids_lock = threading.Lock()
+
 class StripeService:
     """Service für Stripe Payment Integration"""
     
+    # Unveränderliches Grundgerüst jeder Checkout Session (wird pro Request nur entpackt).
+    # Nested-Werte müssen echte dict/tuple sein, da der Stripe-Encoder nur diese auflöst.
+    _SESSION_TEMPLATE = MappingProxyType({
+        'payment_method_types': ('card',),
+        'mode': 'payment',
+        'automatic_tax': {'enabled': False},
+    })
+    _INVOICE_CREATION_TEMPLATE = MappingProxyType({
+        'enabled': True,
+    })
+    
     def __init__(self):
         # Stripe API Key aus Umgebungsvariablen
         stripe_key = os.getenv('STRIPE_SECRET_KEY')
         if not stripe_key:
             raise ValueError("STRIPE_SECRET_KEY muss in .env gesetzt sein")
             
-        stripe.api_key = stripe_key
+        # Das stripe-SDK wird erst beim ersten Stripe-Call geladen (siehe _stripe)
+        self._api_key = stripe_key
+        self._stripe_module = None
+        self._stripe_lock = threading.Lock()
+        
+        # Semaphore wird erst im laufenden Event Loop angelegt (siehe _run_in_thread)
+        self._concurrency: Optional[asyncio.Semaphore] = None
         self.webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
         
+        # HMAC-Zustand mit dem Webhook-Secret einmalig initialisieren, pro Event nur kopieren
+        self._webhook_hmac = (
+            hmac.new(self.webhook_secret.encode('utf-8'), digestmod=hashlib.sha256)
+            if self.webhook_secret else None
+        )
+        
         # Frontend URL für Redirects - verwende lokale Entwicklung als Fallback
         self.frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000')
         
         logger.info("Stripe Service initialisiert")
     
+    @property
+    def _stripe(self):
+        """Das stripe-Modul, beim ersten Zugriff importiert und konfiguriert"""
+        if self._stripe_module is None:
+            self._ensure_stripe()
+        return self._stripe_module
+    
+    def _ensure_stripe(self) -> None:
+        """
+        Importiert das stripe-SDK, setzt den API-Key und den HTTP-Client. Läuft einmal
+        pro Instanz - Requests ohne Stripe-Bezug (und der Serverstart) laden das SDK nie.
+        """
+        with self._stripe_lock:
+            if self._stripe_module is not None:
+                return
+            import stripe
+            if stripe.api_key != self._api_key:
+                stripe.api_key = self._api_key
+            stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+            self._configure_http_client(stripe)
+            self._stripe_module = stripe
+    
+    @staticmethod
+    def _configure_http_client(stripe) -> None:
+        """
+        Setzt einen gepoolten requests.Session-Client als Stripe-Standard-HTTP-Client,
+        damit aufeinanderfolgende API-Calls die TLS-Verbindung wiederverwenden (Keep-Alive)
+        """
+        if isinstance(stripe.default_http_client, stripe.http_client.RequestsClient):
+            return
+        
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=STRIPE_POOL_CONNECTIONS,
+                                              pool_maxsize=STRIPE_POOL_MAXSIZE))
+        stripe.default_http_client = stripe.http_client.RequestsClient(
+            session=session, timeout=STRIPE_HTTP_TIMEOUT
+        )
+    
+    async def _run_in_thread(self, func, *args, **kwargs):
+        """
+        Führt einen blockierenden Stripe-Call in einem Worker-Thread aus, damit der
+        Event Loop frei bleibt. Begrenzt auf STRIPE_MAX_CONCURRENCY parallele Calls.
+        """
+        if self._concurrency is None:
+            self._concurrency = asyncio.Semaphore(STRIPE_MAX_CONCURRENCY)
+        async with self._concurrency:
+            return await asyncio.to_thread(func, *args, **kwargs)
+    
+    def _call_stripe(self, func, *args, **kwargs):
+        """
+        Führt einen Stripe-API-Call hinter dem Circuit Breaker aus.
+        
+        Ist der Breaker offen, wird sofort ein APIConnectionError geworfen statt einen
+        Worker-Thread auf die Timeouts einer gestörten Stripe-API warten zu lassen.
+        """
+        error = self._stripe.error
+        with _breaker_lock:
+            if _breaker_state['open_until'] > time.monotonic():
+                raise error.APIConnectionError("Stripe vorübergehend nicht erreichbar (Circuit Breaker offen)")
+        
+        try:
+            result = func(*args, **kwargs)
+        except (error.APIConnectionError, error.APIError):
+            with _breaker_lock:
+                _breaker_state['failures'] += 1
+                if _breaker_state['failures'] >= STRIPE_BREAKER_FAILURE_THRESHOLD:
+                    # Zeitpunkt nach dem (ggf. langen) fehlgeschlagenen Call, nicht davor
+                    _breaker_state['open_until'] = time.monotonic() + STRIPE_BREAKER_RESET_TIMEOUT
+                    # Nach Ablauf reicht ein weiterer Fehler, um erneut zu öffnen (Half-Open)
+                    _breaker_state['failures'] = STRIPE_BREAKER_FAILURE_THRESHOLD - 1
+                    logger.warning("Stripe Circuit Breaker geöffnet für %ss", STRIPE_BREAKER_RESET_TIMEOUT)
+            raise
+        
+        if _breaker_state['failures']:
+            with _breaker_lock:
+                _breaker_state['failures'] = 0
+        return result
+    
+    def _get_coupon_cached(self, coupon_code: str) -> Optional[Any]:
+        """
+        Holt einen Coupon von Stripe, wiederholte Lookups werden aus dem Cache bedient.
+        
+        Returns:
+            Coupon-Objekt oder None wenn der Code bei Stripe nicht existiert.
+            Andere Stripe-Fehler werden weitergereicht und nicht gecacht.
+        """
+        if not _COUPON_CODE_RE.match(coupon_code):
+            return None
+        
+        now = time.monotonic()
+        with _coupon_cache_lock:
+            cached = _coupon_cache.get(coupon_code)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        try:
+            coupon = self._call_stripe(self._stripe.Coupon.retrieve, coupon_code)
+            ttl = COUPON_CACHE_TTL
+        except self._stripe.error.InvalidRequestError:
+            coupon = None
+            ttl = COUPON_CACHE_NEGATIVE_TTL
+        
+        with _coupon_cache_lock:
+            if len(_coupon_cache) >= COUPON_CACHE_MAXSIZE and coupon_code not in _coupon_cache:
+                _coupon_cache.pop(next(iter(_coupon_cache)))
+            _coupon_cache[coupon_code] = (now + ttl, coupon)
+        return coupon
+    
     def create_checkout_session(
         self, 
         plan_id: str,
@@ -57,15 +439,19 @@ class StripeService:
             Dict mit checkout_url, session_id, expires_at
         """
         try:
-            logger.info(f"Erstelle Checkout Session für Plan: {plan_id}, Preis: €{price_amount/100}, URL: {url}")
+            logger.info("Erstelle Checkout Session für Plan: %s, Preis: €%s, URL: %s", plan_id, price_amount / 100, url)
+            
+            request_minute = int(time.time()) // 60
             
             # Session Metadata erstellen (kompatibel mit Webhook)
+            # Die Währung steht bereits auf der Session selbst und wird nicht dupliziert;
+            # original_price_amount bleibt, da amount_total den Preis nach Rabatt enthält.
+            # Dasselbe Dict wird als Session- und Rechnungs-Metadata referenziert (keine Kopie).
             session_metadata = {
                 'plan_id': plan_id,
                 'website_url': url,  # Wichtig: muss 'website_url' heißen für Webhook!
                 'user_id': user_id,
                 'original_price_amount': str(price_amount),
-                'currency': currency,
                 'analysis_type': 'wcag_accessibility'
             }
             
@@ -73,226 +459,66 @@ class StripeService:
             if metadata:
                 session_metadata.update(metadata)
             
-            line_items = []
-            
-            # Spezielle Behandlung für nachträglich gekauftes Zertifikat
-            if plan_id == 'certificate_only':
-                # Berechne Netto und MwSt separat für nachträglich gekauftes Zertifikat
-                net_amount = int((price_amount / 1.19))  # Netto-Betrag
-                vat_amount = price_amount - net_amount   # MwSt-Betrag
-                
-                # Netto Line Item für nachträglich gekauftes Zertifikat
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': 'Offizielles Zertifikat (netto)',
-                            'description': f'Rechtswirksames Zertifikat vom vitium e.V. für {url}',
-                        },
-                        'unit_amount': net_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                # MwSt Line Item für nachträglich gekauftes Zertifikat
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': '19% Mehrwertsteuer',
-                            'description': 'Gesetzliche Mehrwertsteuer auf Offizielles Zertifikat',
-                        },
-                        'unit_amount': vat_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                logger.info(f"Certificate: Netto €{net_amount/100}, MwSt €{vat_amount/100}, Gesamt €{price_amount/100}")
-                
-            elif plan_id == 'professional_fix':
-                # Spezielle Behandlung für Professionelle Website-Überarbeitung
-                net_amount = int((price_amount / 1.19))  # Netto-Betrag
-                vat_amount = price_amount - net_amount   # MwSt-Betrag
-                
-                # Hole Upgrade-Details für bessere Beschreibung
-                page_count = upgrade_details.get('detected_pages', 1) if upgrade_details else 1
-                
-                # Netto Line Item für professionelle Überarbeitung
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': 'Professionelle Website-Überarbeitung (netto)',
-                            'description': f'Vollständige Code-Überarbeitung durch zertifizierten Barrierefreiheitsexperten für {url} ({page_count} Seiten)',
-                        },
-                        'unit_amount': net_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                # MwSt Line Item für professionelle Überarbeitung
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': '19% Mehrwertsteuer',
-                            'description': 'Gesetzliche Mehrwertsteuer auf Professionelle Website-Überarbeitung',
-                        },
-                        'unit_amount': vat_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                logger.info(f"Professional Fix: Netto €{net_amount/100}, MwSt €{vat_amount/100}, Gesamt €{price_amount/100} ({page_count} Seiten)")
-                
-            else:
-                # Standard WCAG-Analyse (basic/enterprise)
-                # Bei Enterprise ist Zertifikat bereits im Preis enthalten
-                # Produkt-Name basierend auf Plan
-                product_names = {
-                    "basic": "WCAG Basic Analyse",
-                    "enterprise": "WCAG Enterprise Analyse (inkl. Zertifikat)"
-                }
-                
-                product_name = product_names.get(plan_id, "WCAG Analyse")
-                # Berechne Netto und MwSt separat für die Hauptanalyse
-                net_amount = int((price_amount / 1.19))  # Netto-Betrag
-                vat_amount = price_amount - net_amount   # MwSt-Betrag
-                
-                # Netto Line Item für die Hauptanalyse
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': f'{product_name} (netto)',
-                            'description': f'Barrierefreiheits-Analyse für {url}',
-                        },
-                        'unit_amount': net_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                # MwSt Line Item für die Hauptanalyse
-                line_items.append({
-                    'price_data': {
-                        'currency': currency,
-                        'product_data': {
-                            'name': '19% Mehrwertsteuer',
-                            'description': f'Gesetzliche Mehrwertsteuer auf {product_name}',
-                        },
-                        'unit_amount': vat_amount,
-                    },
-                    'quantity': 1,
-                })
-                
-                logger.info(f"{product_name}: Netto €{net_amount/100}, MwSt €{vat_amount/100}, Gesamt €{price_amount/100}")
-            
-                # Füge separate Line Items für Upgrades hinzu (falls vorhanden)
-                if upgrade_details and upgrade_details.get('selected_upgrades'):
-                    logger.info(f"Füge Upgrades hinzu zu {product_name}: {upgrade_details}")
-                    
-                    # Bei Enterprise ist Zertifikat bereits inklusive - nicht nochmal berechnen!
-                    if plan_id == 'enterprise' and 'certificate' in upgrade_details.get('selected_upgrades', []):
-                        logger.info("Enterprise Plan: Zertifikat ist bereits im Preis enthalten - überspringe separate Berechnung")
-                        selected_upgrades_filtered = [u for u in upgrade_details.get('selected_upgrades', []) if u != 'certificate']
-                    else:
-                        selected_upgrades_filtered = upgrade_details.get('selected_upgrades', [])
-                    
-                    # Upgrade-Namen und Preise definieren (netto)
-                    upgrade_info = {
-                        'professional_fix': {
-                            'name': 'Professionelle Website-Überarbeitung',
-                            'description': 'Vollständige Code-Überarbeitung durch zertifizierten Barrierefreiheitsexperten',
-                            'price_net': int(200000)  # €2000 netto in Cent
-                        },
-                        'certificate': {
-                            'name': 'Offizielles Zertifikat',
-                            'description': 'Rechtswirksames Zertifikat vom vitium e.V. - geprüft von Menschen mit Behinderungen',
-                            'price_net': int(90000)   # €900 netto in Cent
-                        }
-                    }
-                    
-                    # Erstelle Line Items für jedes ausgewählte Upgrade (mit separater MwSt)
-                    for upgrade_id in selected_upgrades_filtered:
-                        if upgrade_id in upgrade_info:
-                            upgrade = upgrade_info[upgrade_id]
-                            net_upgrade_amount = upgrade['price_net']
-                            vat_upgrade_amount = int(net_upgrade_amount * 0.19)
-                            
-                            # Netto Line Item für Upgrade
-                            line_items.append({
-                                'price_data': {
-                                    'currency': currency,
-                                    'product_data': {
-                                        'name': f"{upgrade['name']} (netto)",
-                                        'description': upgrade['description'],
-                                    },
-                                    'unit_amount': net_upgrade_amount,
-                                },
-                                'quantity': 1,
-                            })
-                            
-                            # MwSt Line Item für Upgrade
-                            line_items.append({
-                                'price_data': {
-                                    'currency': currency,
-                                    'product_data': {
-                                        'name': '19% Mehrwertsteuer',
-                                        'description': f'Gesetzliche Mehrwertsteuer auf {upgrade["name"]}',
-                                    },
-                                    'unit_amount': vat_upgrade_amount,
-                                },
-                                'quantity': 1,
-                            })
-                            
-                            logger.info(f"Upgrade hinzugefügt: {upgrade['name']} - Netto €{net_upgrade_amount/100}, MwSt €{vat_upgrade_amount/100}")
+            line_items = _build_line_items(plan_id, price_amount, url, upgrade_details, currency)
             
             # Checkout Session Parameter
             session_params = {
-                'payment_method_types': ['card'],
+                **self._SESSION_TEMPLATE,
                 'line_items': line_items,
-                'mode': 'payment',
                 'customer_email': customer_email,
                 'success_url': success_url,
                 'cancel_url': cancel_url,
                 'metadata': session_metadata,
-                'automatic_tax': {'enabled': False},
                 'invoice_creation': {
-                    'enabled': True,
+                    **self._INVOICE_CREATION_TEMPLATE,
                     'invoice_data': {
-                        'description': f'Barrierefreiheits-Services: {url}',
+                        'description': _INVOICE_DESCRIPTION_FMT.format(url=url),
                         'metadata': session_metadata,
                     }
                 },
-                'expires_at': int((datetime.now() + timedelta(minutes=30)).timestamp())
+                # An die Minute gebunden, damit Wiederholungen identische Parameter senden
+                'expires_at': (request_minute + 1) * 60 + _EXPIRES_SECONDS
             }
             
             # Wenn ein spezifischer Coupon-Code übergeben wurde, validiere und verwende ihn
             if coupon_code:
                 try:
                     # Prüfe ob Coupon existiert
-                    coupon = stripe.Coupon.retrieve(coupon_code)
-                    logger.info(f"Verwende Coupon: {coupon_code} ({coupon.percent_off}% off)")
-                    
-                    # Füge Discount zur Session hinzu (anstatt allow_promotion_codes)
-                    session_params['discounts'] = [{'coupon': coupon_code}]
+                    coupon = self._get_coupon_cached(coupon_code)
+                    if coupon is None:
+                        logger.warning("Ungültiger Coupon-Code: %s", coupon_code)
+                        # Session trotzdem erstellen, aber mit allow_promotion_codes für manuelle Eingabe
+                        session_params['allow_promotion_codes'] = True
+                    else:
+                        logger.info("Verwende Coupon: %s (%s%% off)", coupon_code, coupon.percent_off)
+                        
+                        # Füge Discount zur Session hinzu (anstatt allow_promotion_codes)
+                        session_params['discounts'] = [{'coupon': coupon_code}]
                     
-                except stripe.error.InvalidRequestError:
-                    logger.warning(f"Ungültiger Coupon-Code: {coupon_code}")
-                    # Session trotzdem erstellen, aber mit allow_promotion_codes für manuelle Eingabe
-                    session_params['allow_promotion_codes'] = True
                 except Exception as e:
-                    logger.error(f"Fehler beim Validieren des Coupons: {str(e)}")
+                    logger.error("Fehler beim Validieren des Coupons: %s", e)
                     # Session trotzdem erstellen, aber mit allow_promotion_codes für manuelle Eingabe
                     session_params['allow_promotion_codes'] = True
             else:
                 # Nur wenn kein Coupon-Code übergeben wurde, erlaube manuelle Eingabe
                 session_params['allow_promotion_codes'] = True
             
-            # Checkout Session erstellen
-            session = stripe.checkout.Session.create(**session_params)
+            # Checkout Session erstellen - der Idempotency-Key macht Wiederholungen desselben
+            # Checkouts innerhalb einer Minute gefahrlos (Stripe liefert die bestehende Session)
+            idempotency_key = _checkout_idempotency_key(
+                user_id, plan_id, price_amount, url, coupon_code, request_minute
+            )
+            try:
+                session = self._call_stripe(
+                    self._stripe.checkout.Session.create,
+                    **session_params, idempotency_key=idempotency_key
+                )
+            except self._stripe.error.IdempotencyError:
+                # Gleicher Key mit abweichenden Parametern (z.B. andere Metadata) - neue Session
+                logger.warning("Idempotency-Key %s mit anderen Parametern verwendet - erstelle neue Session", idempotency_key)
+                session = self._call_stripe(self._stripe.checkout.Session.create, **session_params)
             
-            logger.info(f"Stripe Checkout Session erstellt: {session.id} für User {user_id}")
+            logger.info("Stripe Checkout Session erstellt: %s für User %s", session.id, user_id)
             
             return {
                 "checkout_url": session.url,
@@ -300,32 +526,37 @@ class StripeService:
                 "expires_at": session.expires_at
             }
             
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe Fehler bei Checkout Session: {str(e)}")
+        except self._stripe.error.StripeError as e:
+            logger.error("Stripe Fehler bei Checkout Session: %s", e)
             raise Exception(f"Payment-Fehler: {str(e)}")
         except Exception as e:
-            logger.error(f"Unerwarteter Fehler bei Checkout Session: {str(e)}")
+            logger.error("Unerwarteter Fehler bei Checkout Session: %s", e)
             raise
     
+    async def create_checkout_session_async(self, **kwargs) -> Dict[str, Any]:
+        """Async-Variante von create_checkout_session (gleiche Keyword-Argumente)"""
+        return await self._run_in_thread(self.create_checkout_session, **kwargs)
+    
     def get_checkout_session(self, session_id: str) -> Dict[str, Any]:
         """Holt Details einer Checkout Session, inklusive Payment Intent"""
         try:
             logger.info(f"Rufe Session {session_id} von Stripe ab mit expandiertem Payment Intent")
-            session = stripe.checkout.Session.retrieve(
+            session = self._call_stripe(
+                self._stripe.checkout.Session.retrieve,
                 session_id,
                 expand=["payment_intent"]
             )
             return session
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             logger.error(f"Fehler beim Abrufen der Session {session_id}: {str(e)}")
             raise Exception(f"Stripe Session nicht gefunden: {str(e)}")
 
     def get_payment_intent(self, payment_intent_id: str) -> Dict[str, Any]:
         """Holt einen Payment Intent"""
         try:
-            payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            payment_intent = self._call_stripe(self._stripe.PaymentIntent.retrieve, payment_intent_id)
             return payment_intent
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             logger.error(f"Fehler beim Abrufen des Payment Intent {payment_intent_id}: {str(e)}")
             raise Exception(f"Stripe Payment Intent nicht gefunden: {str(e)}")
     
@@ -340,7 +571,7 @@ class StripeService:
             Session Details inklusive Payment Status
         """
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = self._call_stripe(self._stripe.checkout.Session.retrieve, session_id)
             
             return {
                 "id": session.id,
@@ -355,7 +586,7 @@ class StripeService:
                 "expires_at": session.expires_at
             }
             
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             logger.error(f"Fehler beim Abrufen der Session {session_id}: {str(e)}")
             raise Exception(f"Session nicht gefunden: {str(e)}")
     
@@ -369,15 +600,25 @@ class StripeService:
         Returns:
             True wenn Zahlung erfolgreich
         """
+        if session_id in _paid_session_ids:
+            return True
+        
         try:
-            session = self.get_session_details(session_id)
-            return session["payment_status"] == "paid" and session["status"] == "complete"
+            session = self._call_stripe(self._stripe.checkout.Session.retrieve, session_id)
+            is_paid = session.payment_status == "paid" and session.status == "complete"
+            if is_paid:
+                # Bezahlt + abgeschlossen ist ein Endzustand - muss nie erneut abgefragt werden
+                with _paid_session_ids_lock:
+                    if len(_paid_session_ids) >= PAID_SESSION_CACHE_MAXSIZE:
+                        _paid_session_ids.pop(next(iter(_paid_session_ids)))
+                    _paid_session_ids[session_id] = True
+            return is_paid
             
         except Exception as e:
             logger.error(f"Fehler beim Verifizieren der Zahlung für Session {session_id}: {str(e)}")
             return False
     
-    def construct_webhook_event(self, payload: bytes, sig_header: str) -> stripe.Event:
+    def construct_webhook_event(self, payload: Union[bytes, memoryview], sig_header: str) -> 'stripe.Event':
         """
         Verifiziert die Webhook-Signatur und konstruiert das Event-Objekt.
         Wirft eine Exception bei einem Fehler.
@@ -387,54 +628,114 @@ class StripeService:
             raise ValueError("Webhook Secret nicht konfiguriert, kann Event nicht prüfen.")
             
         try:
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, self.webhook_secret
-            )
+            # Signatur prüfen (gleiche Regeln wie stripe.Webhook.construct_event), das
+            # Payload danach direkt aus dem Puffer parsen (orjson falls verfügbar).
+            # HMAC und orjson lesen einen memoryview ohne Kopie, nur json braucht bytes.
+            payload_bytes = payload.encode('utf-8') if isinstance(payload, str) else payload
+            self._verify_webhook_signature(payload_bytes, sig_header)
+            if orjson:
+                data = orjson.loads(payload_bytes)
+            else:
+                data = json.loads(bytes(payload_bytes) if isinstance(payload_bytes, memoryview) else payload_bytes)
+            event = self._stripe.Event.construct_from(data, self._stripe.api_key)
             return event
-        except stripe.error.SignatureVerificationError as e:
+        except self._stripe.error.SignatureVerificationError as e:
             logger.error(f"Webhook Signatur-Verifizierung fehlgeschlagen: {e}")
             raise ValueError("Ungültige Webhook-Signatur") from e
         except Exception as e:
             logger.error(f"Fehler beim Konstruieren des Webhook-Events: {e}")
             raise ValueError("Fehler bei der Webhook-Verarbeitung") from e
 
+    def mark_event_processed(self, event_id: str) -> bool:
+        """
+        Markiert ein Webhook-Event als verarbeitet
+        
+        Returns:
+            True beim ersten Auftreten, False wenn die Event-ID bereits verarbeitet wurde
+        """
+        now = time.monotonic()
+        with _processed_event_ids_lock:
+            expires = _processed_event_ids.get(event_id)
+            if expires is not None and expires > now:
+                return False
+            if len(_processed_event_ids) >= WEBHOOK_EVENT_CACHE_MAXSIZE and event_id not in _processed_event_ids:
+                _processed_event_ids.pop(next(iter(_processed_event_ids)))
+            _processed_event_ids[event_id] = now + WEBHOOK_EVENT_TTL
+        return True
+    
+    def unmark_event_processed(self, event_id: str) -> None:
+        """Gibt eine Event-ID wieder frei, damit eine Stripe-Wiederholung erneut verarbeitet wird"""
+        with _processed_event_ids_lock:
+            _processed_event_ids.pop(event_id, None)
+    
+    def _verify_webhook_signature(self, payload: Union[bytes, memoryview], sig_header: str) -> None:
+        """
+        Prüft den Stripe-Signature-Header (t=<timestamp>,v1=<signatur>[,v1=...]) gegen das Payload
+        
+        Wirft stripe.error.SignatureVerificationError bei fehlerhaftem Header, falscher
+        Signatur oder einem Timestamp außerhalb der Toleranz.
+        """
+        timestamp = None
+        signatures = []
+        for part in sig_header.split(','):
+            key, _, value = part.partition('=')
+            if key == 't':
+                timestamp = value
+            elif key == 'v1':
+                signatures.append(value)
+        
+        if timestamp is None or not timestamp.isdigit():
+            raise self._stripe.error.SignatureVerificationError(
+                "Unable to extract timestamp and signatures from header", sig_header, payload)
+        if not signatures:
+            raise self._stripe.error.SignatureVerificationError(
+                "No signatures found with expected scheme v1", sig_header, payload)
+        
+        mac = self._webhook_hmac.copy()
+        mac.update(timestamp.encode('ascii') + b'.')
+        mac.update(payload)
+        expected = mac.hexdigest()
+        if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+            raise self._stripe.error.SignatureVerificationError(
+                "No signatures found matching the expected signature for payload", sig_header, payload)
+        
+        if int(timestamp) < time.time() - self._stripe.Webhook.DEFAULT_TOLERANCE:
+            raise self._stripe.error.SignatureVerificationError(
+                "Timestamp outside the tolerance zone (%s)" % timestamp, sig_header, payload)
+    
     def create_test_mode_prices(self) -> Dict[str, str]:
         """
         Erstellt Test-Preise für Entwicklung
         Nur für Testzwecke!
         """
         try:
-            # Basic Plan
-            basic_price = stripe.Price.create(
-                unit_amount=35000,  # €350.00
-                currency='eur',
-                product_data={
-                    'name': 'WCAG Basic Analyse',
-                    'description': 'Grundlegende Barrierefreiheits-Analyse'
-                },
-            )
-            
-            # Enterprise Plan  
-            enterprise_price = stripe.Price.create(
-                unit_amount=45000,  # €450.00
-                currency='eur',
-                product_data={
-                    'name': 'WCAG Enterprise Analyse',
-                    'description': 'Umfassende Barrierefreiheits-Analyse mit Premium-Features'
-                },
-            )
+            # Beide Preise parallel anlegen - Gesamtlatenz max(t1, t2) statt t1 + t2.
+            # Stabile Idempotency-Keys machen Wiederholungen innerhalb von 24h gefahrlos.
+            # Jeder Call läuft über _call_stripe, damit auch hier der Circuit Breaker greift.
+            with ThreadPoolExecutor(max_workers=len(_TEST_MODE_PRICES)) as executor:
+                futures = {
+                    plan_id: executor.submit(
+                        self._call_stripe,
+                        self._stripe.Price.create,
+                        idempotency_key=f"test-price-{plan_id}-v1",
+                        **price_kwargs
+                    )
+                    for plan_id, price_kwargs in _TEST_MODE_PRICES.items()
+                }
+                prices = {plan_id: future.result().id for plan_id, future in futures.items()}
             
             logger.info("Test-Preise erstellt")
             
-            return {
-                "basic": basic_price.id,
-                "enterprise": enterprise_price.id
-            }
+            return prices
             
         except Exception as e:
             logger.error(f"Fehler beim Erstellen der Test-Preise: {str(e)}")
             raise
 
+    async def validate_coupon_async(self, coupon_code: str) -> Dict[str, Any]:
+        """Async-Variante von validate_coupon"""
+        return await self._run_in_thread(self.validate_coupon, coupon_code)
+    
     def validate_coupon(self, coupon_code: str) -> Dict[str, Any]:
         """
         Validiert einen Rabattcode und gibt Details zurück
@@ -445,8 +746,19 @@ class StripeService:
         Returns:
             Dict mit Coupon-Details oder Fehlermeldung
         """
+        if not coupon_code or not _COUPON_CODE_RE.match(coupon_code):
+            return {
+                "valid": False,
+                "error": "Ungültiges Format"
+            }
+        
         try:
-            coupon = stripe.Coupon.retrieve(coupon_code)
+            coupon = self._get_coupon_cached(coupon_code)
+            if coupon is None:
+                return {
+                    "valid": False,
+                    "error": "Rabattcode nicht gefunden"
+                }
             
             return {
                 "valid": True,
@@ -459,13 +771,19 @@ class StripeService:
                 "description": getattr(coupon, 'description', None)
             }
             
-        except stripe.error.InvalidRequestError:
-            return {
-                "valid": False,
-                "error": "Rabattcode nicht gefunden"
-            }
         except Exception as e:
             return {
                 "valid": False,
                 "error": f"Fehler beim Validieren: {str(e)}"
-            } 
\ No newline at end of file
+            } 
+
+
+@lru_cache(maxsize=1)
+def get_stripe_service() -> StripeService:
+    """
+    Gibt die prozessweite StripeService-Instanz zurück
+    
+    Die Umgebungsvariablen werden nur beim ersten Aufruf gelesen. Schlägt die
+    Initialisierung fehl, wird nichts gecacht und der nächste Aufruf versucht es erneut.
+    """
+    return StripeService()
@@ -1,19 +1,276 @@
 import os
+import asyncio
 from supabase import create_client, Client
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 import uuid
+import time
+import random
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import traceback
+import httpx
 from dotenv import load_dotenv
 
+try:
+    import h2  # noqa: F401 - wird von httpx für HTTP/2 benötigt
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    # Fallback auf die Standardbibliothek (httpx json=) wenn orjson nicht installiert ist
+    orjson = None
+
+try:
+    from psycopg import OperationalError as PgOperationalError
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import ConnectionPool, PoolTimeout
+    _PSYCOPG_AVAILABLE = True
+    # Verbindungsfehler, nach denen der direkte Postgres-Pfad für den Prozess abgeschaltet wird
+    _PG_CONNECTION_ERRORS: Tuple[type, ...] = (PgOperationalError, PoolTimeout)
+except ImportError:
+    # Fallback wenn psycopg nicht installiert ist - alle Writes laufen über PostgREST
+    Jsonb = None
+    ConnectionPool = None
+    _PSYCOPG_AVAILABLE = False
+    _PG_CONNECTION_ERRORS = ()
+
 logger = logging.getLogger(__name__)
 
-class SupabaseService:
-    def __init__(self):
-        # Explizit .env laden um sicherzustellen dass Variablen verfügbar sind
-        load_dotenv()
+# .env einmalig beim Import laden - nur falls die Variablen nicht schon gesetzt sind (Produktion)
+if not os.getenv('SUPABASE_URL'):
+    load_dotenv()
+
+# Fortschritts-Updates werden gepuffert und nur geschrieben, wenn sich der Wert um mindestens
+# PROGRESS_FLUSH_MIN_DELTA Prozentpunkte geändert hat oder der letzte Write PROGRESS_FLUSH_INTERVAL
+# Sekunden zurückliegt. Zurückgehaltene Werte schreibt ein Timer nach PROGRESS_FLUSH_DELAY Sekunden.
+PROGRESS_FLUSH_MIN_DELTA = 5
+PROGRESS_FLUSH_INTERVAL = 2.0
+PROGRESS_FLUSH_DELAY = 1.0
+
+# Konfliktziel für Upserts in analysis_results (Unique-Index aus supabase_performance_migration.sql)
+MODULE_RESULT_CONFLICT_COLUMNS = 'job_id,module_name,user_id'
+
+# Maximale Zeilen pro Bulk-Upsert (begrenzt die Request-Größe bei PostgREST)
+MODULE_RESULT_BULK_CHUNK = 50
+
+# Spaltenlisten für Lesezugriffe auf analysis_jobs - das result-Feld (finaler Bericht, oft
+# viele KB JSON) wird nur für get_job_results geladen
+JOB_STATUS_COLUMNS = 'id,status,progress,error,user_id,url,plan,created_at,updated_at,completed_at'
+USER_JOBS_COLUMNS = 'id,url,plan,status,progress,error,user_id,payment_session_id,selected_upgrades,created_at,updated_at,completed_at'
+
+# Kurzlebiger Cache für get_job_status: job_id -> (Ablaufzeit, Job-Zeile oder None)
+# Status-Polling, Ergebnis-Seite und Download innerhalb ~1s teilen sich einen Request
+JOB_STATUS_CACHE_TTL = 1.0
+JOB_STATUS_CACHE_MAXSIZE = 1024
+_job_status_cache: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+_job_status_cache_lock = threading.Lock()
+
+
+def _invalidate_job_status(job_id: str) -> None:
+    """Entfernt einen Job aus dem Status-Cache (nach jedem Write auf analysis_jobs)"""
+    with _job_status_cache_lock:
+        _job_status_cache.pop(job_id, None)
+
+
+def _utc_now_iso() -> str:
+    """Aktueller Zeitpunkt als ISO-String mit UTC-Offset (für timestamptz-Spalten)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+# HTTP-Verbindungspool für PostgREST-Calls (Keep-Alive über alle Service-Aufrufe hinweg)
+SUPABASE_POOL_MAX_CONNECTIONS = 100
+SUPABASE_POOL_MAX_KEEPALIVE = 50
+SUPABASE_POOL_KEEPALIVE_EXPIRY = 60
+
+# Wiederholung von Writes nur bei Transportfehlern (Verbindungsabbruch, Timeout) mit
+# exponentiellem Backoff und Jitter - Schema-, Auth- und Validierungsfehler schlagen sofort fehl
+SUPABASE_WRITE_MAX_ATTEMPTS = 3
+SUPABASE_RETRY_INITIAL_DELAY = 0.1
+SUPABASE_RETRY_MAX_DELAY = 2.0
+
+
+def _execute_with_retry(query):
+    """Führt eine PostgREST-Abfrage aus und wiederholt sie bei httpx.TransportError"""
+    for attempt in range(1, SUPABASE_WRITE_MAX_ATTEMPTS + 1):
+        try:
+            return query.execute()
+        except httpx.TransportError as e:
+            if attempt == SUPABASE_WRITE_MAX_ATTEMPTS:
+                raise
+            delay = min(SUPABASE_RETRY_MAX_DELAY, SUPABASE_RETRY_INITIAL_DELAY * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            logger.warning(f"Supabase-Transportfehler ({e}), Versuch {attempt}/{SUPABASE_WRITE_MAX_ATTEMPTS} - neuer Versuch in {delay:.2f}s")
+            time.sleep(delay)
+
+
+# Fire-and-forget-Writes (Fortschritt, Job-Status, Modul-Fehler) laufen im Hintergrund.
+# Je Job immer derselbe Single-Thread-Executor, damit Writes eines Jobs in Aufrufreihenfolge
+# ankommen (ein später Fortschritts-Write darf 'completed' nicht überschreiben).
+SUPABASE_WRITE_WORKERS = 4
+_write_executors = [
+    ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"supabase-write-{i}")
+    for i in range(SUPABASE_WRITE_WORKERS)
+]
+
+
+def _submit_write(job_id: str, func, *args) -> None:
+    """Reiht einen Write für job_id in dessen Executor ein"""
+    _write_executors[hash(job_id) % SUPABASE_WRITE_WORKERS].submit(func, *args)
+
+
+@atexit.register
+def _flush_pending_writes() -> None:
+    """Wartet beim Beenden des Prozesses auf alle ausstehenden Writes"""
+    for executor in _write_executors:
+        executor.shutdown(wait=True)
+
+
+# Direkte Postgres-Verbindungen für Hot-Path-Writes (optional, Supavisor-DSN in
+# SUPABASE_POOLER_DSN). Ohne DSN oder psycopg laufen alle Writes über PostgREST.
+PG_POOL_MIN_SIZE = 1
+PG_POOL_MAX_SIZE = 10
+# Kurze Timeouts: bei nicht erreichbarem Postgres soll der Write schnell auf PostgREST ausweichen
+PG_CONNECT_TIMEOUT = 5      # Sekunden für den Verbindungsaufbau (libpq connect_timeout)
+PG_POOL_TIMEOUT = 5.0       # Sekunden Wartezeit auf eine freie Verbindung aus dem Pool
+_pg_pool: Optional["ConnectionPool"] = None
+_pg_pool_failed = False     # Nach einem Verbindungsfehler laufen alle Writes direkt über PostgREST
+_pg_pool_lock = threading.Lock()
+
+_PG_PROGRESS_SQL = (
+    "UPDATE analysis_jobs SET progress = %s, status = %s, updated_at = %s, "
+    "completed_at = COALESCE(%s, completed_at) WHERE id = %s"
+)
+
+
+def _get_pg_pool() -> Optional["ConnectionPool"]:
+    """
+    Liefert den Postgres-Connection-Pool oder None, wenn kein direkter Zugriff konfiguriert
+    ist oder der Pool nicht aufgebaut werden konnte (wird dann nicht erneut versucht)
+    """
+    global _pg_pool, _pg_pool_failed
+    if _pg_pool is not None or _pg_pool_failed or not _PSYCOPG_AVAILABLE:
+        return _pg_pool
+    
+    dsn = os.getenv('SUPABASE_POOLER_DSN')
+    if not dsn:
+        return None
+    
+    with _pg_pool_lock:
+        if _pg_pool is None and not _pg_pool_failed:
+            pool = None
+            try:
+                # prepare_threshold=None: der Supavisor-Transaction-Mode unterstützt keine
+                # serverseitig vorbereiteten Statements über Transaktionen hinweg
+                pool = ConnectionPool(dsn, min_size=PG_POOL_MIN_SIZE, max_size=PG_POOL_MAX_SIZE,
+                                      kwargs={'prepare_threshold': None, 'connect_timeout': PG_CONNECT_TIMEOUT},
+                                      timeout=PG_POOL_TIMEOUT, open=True)
+                pool.wait(timeout=PG_CONNECT_TIMEOUT)
+                _pg_pool = pool
+                logger.info("✅ Postgres-Pool für direkte Writes initialisiert")
+            except Exception as e:
+                _pg_pool_failed = True
+                if pool is not None:
+                    pool.close()
+                logger.warning(f"Postgres-Pool nicht verfügbar, alle Writes laufen über PostgREST: {e}")
+    return _pg_pool
+
+
+def _disable_pg_pool() -> None:
+    """Schaltet den direkten Postgres-Pfad nach einem Verbindungsfehler für den Prozess ab"""
+    global _pg_pool, _pg_pool_failed
+    with _pg_pool_lock:
+        pool, _pg_pool, _pg_pool_failed = _pg_pool, None, True
+    if pool is not None:
+        pool.close()
+
+
+def _pg_write(sql: str, params_seq: List[tuple]) -> bool:
+    """
+    Führt ein Statement für alle Parameter-Tupel in einer Transaktion direkt auf Postgres aus.
+    
+    Returns:
+        False wenn kein Pool konfiguriert ist oder der Write fehlschlug - der Aufrufer
+        schreibt dann über PostgREST.
+    """
+    try:
+        pool = _get_pg_pool()
+        if pool is None:
+            return False
+        
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(sql, params_seq)
+        return True
+    except _PG_CONNECTION_ERRORS as e:
+        logger.warning(f"Postgres nicht erreichbar, direkte Writes werden abgeschaltet: {e}")
+        _disable_pg_pool()
+        return False
+    except Exception as e:
+        logger.warning(f"Direkter Postgres-Write fehlgeschlagen, nutze PostgREST: {e}")
+        return False
+
+
+@lru_cache(maxsize=16)
+def _pg_module_upsert_sql(columns: Tuple[str, ...]) -> str:
+    """INSERT ... ON CONFLICT für analysis_results mit den gegebenen Spalten"""
+    updates = ', '.join(
+        f"{column} = EXCLUDED.{column}" for column in columns
+        if column not in ('job_id', 'module_name', 'user_id')
+    )
+    return (
+        f"INSERT INTO analysis_results ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({MODULE_RESULT_CONFLICT_COLUMNS.replace(',', ', ')}) DO UPDATE SET {updates}"
+    )
+
+
+def _pg_upsert_module_rows(rows: List[Dict[str, Any]]) -> bool:
+    """Upsert von Modul-Zeilen (alle mit denselben Spalten) direkt über Postgres"""
+    try:
+        if _get_pg_pool() is None:
+            return False
+        columns = tuple(rows[0])
+        params_seq = [
+            tuple(Jsonb(row[c]) if c == 'result' and row[c] is not None else row[c] for c in columns)
+            for row in rows
+        ]
+    except Exception as e:
+        logger.warning(f"Direkter Postgres-Upsert nicht möglich, nutze PostgREST: {e}")
+        return False
+    return _pg_write(_pg_module_upsert_sql(columns), params_seq)
+
+
+# Spalten für bulk_seed_results (COPY in analysis_results)
+_SEED_COLUMNS = ('job_id', 'module_name', 'status', 'result', 'token_usage', 'user_id', 'completed_at')
+
+
+# Gemeinsamer Supabase-Client für alle SupabaseService-Instanzen (siehe _get_client)
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> Optional[Client]:
+    """
+    Liefert den prozessweiten Supabase-Client und legt ihn beim ersten Aufruf an.
+    
+    Fehlschläge werden nicht gemerkt, damit ein späterer Aufruf (z.B. nach dem Laden
+    der .env) erneut initialisieren kann. None bedeutet Offline-Modus.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    
+    with _client_lock:
+        if _client is not None:
+            return _client
         
         # Lade Umgebungsvariablen
         supabase_url = os.getenv('SUPABASE_URL')
@@ -21,20 +278,113 @@ class SupabaseService:
         
         if not supabase_url or not supabase_key:
             logger.warning("⚠️ Supabase-Umgebungsvariablen fehlen - arbeite im Offline-Modus")
-            self.client = None
-            return
+            return None
         
         # Vereinfachte und robuste Initialisierung
         try:
             # Versuche die einfachste Initialisierung
-            self.client: Client = create_client(supabase_url, supabase_key)
+            client = create_client(supabase_url, supabase_key)
+            _configure_http_pool(client)
+            _client = client
             logger.info("✅ Supabase-Service erfolgreich initialisiert")
             
         except Exception as e:
             logger.error(f"❌ Supabase-Initialisierungsfehler: {str(e)}")
             logger.error(f"🔍 Traceback: {traceback.format_exc()}")
             logger.warning("🔄 Wechsle zu Offline-Modus")
-            self.client = None
+        
+        return _client
+
+
+# Client für reine Lesezugriffe auf eine Read Replica (SUPABASE_READ_URL, optional)
+_read_client: Optional[Client] = None
+
+
+def _get_read_client() -> Optional[Client]:
+    """
+    Liefert den Client für Lesezugriffe ohne Read-your-writes-Anforderung (nur Listen wie
+    get_user_jobs - Status und Ergebnisse laufen über den primären Client). Ohne
+    SUPABASE_READ_URL (oder wenn die Replica nicht erreichbar ist) der primäre Client.
+    """
+    global _read_client
+    if _read_client is not None:
+        return _read_client
+    
+    read_url = os.getenv('SUPABASE_READ_URL')
+    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+    if not read_url or not supabase_key:
+        return _get_client()
+    
+    with _client_lock:
+        if _read_client is None:
+            try:
+                client = create_client(read_url, supabase_key)
+                _configure_http_pool(client)
+                _read_client = client
+                logger.info("✅ Supabase Read Replica initialisiert")
+            except Exception as e:
+                logger.error(f"❌ Read-Replica-Initialisierungsfehler, nutze primären Client: {str(e)}")
+    
+    return _read_client or _get_client()
+
+
+def _configure_http_pool(client: Client) -> None:
+    """
+    Ersetzt die httpx-Session des PostgREST-Clients durch eine mit größerem Verbindungspool
+    (und HTTP/2, falls h2 installiert ist). ClientOptions von supabase 2.3 erlaubt keinen
+    eigenen httpx-Client, daher wird die Session mit denselben Basis-Einstellungen neu gebaut.
+    """
+    postgrest = client.postgrest
+    session = postgrest.session
+    session_cls = _orjson_session_class(type(session)) if orjson is not None else type(session)
+    postgrest.session = session_cls(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_POOL_KEEPALIVE_EXPIRY
+        ),
+        http2=_HTTP2_AVAILABLE
+    )
+    session.close()
+
+
+@lru_cache(maxsize=None)
+def _orjson_session_class(base: type) -> type:
+    """
+    Leitet von der httpx-Session-Klasse des PostgREST-Clients ab und serialisiert json=-Bodies
+    mit orjson statt der Standardbibliothek (große result/report-Dicts bei Upserts)
+    """
+    class OrjsonSession(base):
+        def request(self, method, url, *, json=None, headers=None, **kwargs):
+            if json is not None and kwargs.get('content') is None:
+                try:
+                    kwargs['content'] = orjson.dumps(json, option=orjson.OPT_NON_STR_KEYS)
+                except TypeError:
+                    # Nicht von orjson serialisierbar - httpx übernimmt wie bisher
+                    return super().request(method, url, json=json, headers=headers, **kwargs)
+                headers = dict(headers or {})
+                headers['Content-Type'] = 'application/json'
+                json = None
+            return super().request(method, url, json=json, headers=headers, **kwargs)
+    
+    OrjsonSession.__name__ = f"Orjson{base.__name__}"
+    return OrjsonSession
+
+
+class SupabaseService:
+    def __init__(self):
+        # Gepufferter Job-Fortschritt (siehe update_job_progress)
+        self._progress_state: Dict[str, Tuple[int, float, str]] = {}  # job_id -> zuletzt geschrieben (progress, zeit, status)
+        self._pending_progress: Dict[str, Tuple[int, str]] = {}      # job_id -> noch nicht geschrieben (progress, status)
+        self._progress_lock = threading.RLock()
+        self._progress_timer: Optional[threading.Timer] = None
+        
+        # Client wird prozessweit geteilt - SupabaseService() pro Request ist damit billig
+        self.client: Optional[Client] = _get_client()
+        self.read_client: Optional[Client] = _get_read_client() if self.client else None
 
     def create_analysis_job(self, url: str, plan: str, user_id: str = None, payment_session_id: str = None, selected_upgrades: list = None) -> str:
         """
@@ -64,7 +414,7 @@ class SupabaseService:
                 'plan': plan,
                 'status': 'running',
                 'progress': 0,
-                'created_at': datetime.now().isoformat(),
+                'created_at': _utc_now_iso(),
                 'user_id': user_id,
                 'payment_session_id': payment_session_id
             }
@@ -80,7 +430,7 @@ class SupabaseService:
             
             logger.info(f"📝 Versuche Job zu erstellen: {job_data}")
             
-            result = self.client.table('analysis_jobs').insert(job_data).execute()
+            result = _execute_with_retry(self.client.table('analysis_jobs').insert(job_data))
             
             if result.data:
                 logger.info(f"✅ Analysis Job erfolgreich in Supabase erstellt: {job_id}")
@@ -98,21 +448,70 @@ class SupabaseService:
             return job_id
 
     def update_job_progress(self, job_id: str, progress: int, status: str = 'running'):
-        """Aktualisiert den Fortschritt eines Jobs"""
+        """
+        Aktualisiert den Fortschritt eines Jobs
+        
+        Kleine Fortschritts-Schritte werden gepuffert und gesammelt geschrieben; Statuswechsel
+        (alles außer 'running') gehen sofort an Supabase.
+        """
         if not self.client:
             return
-            
+        
+        now = time.monotonic()
+        with self._progress_lock:
+            last = self._progress_state.get(job_id)
+            if (status == 'running' and last is not None and last[2] == status
+                    and progress - last[0] < PROGRESS_FLUSH_MIN_DELTA
+                    and now - last[1] < PROGRESS_FLUSH_INTERVAL):
+                self._pending_progress[job_id] = (progress, status)
+                self._schedule_progress_flush()
+                return
+            self._pending_progress.pop(job_id, None)
+            self._progress_state[job_id] = (progress, now, status)
+        
+        _submit_write(job_id, self._write_job_progress, job_id, progress, status)
+    
+    def _schedule_progress_flush(self):
+        """Startet den Flush-Timer, falls noch keiner läuft (Aufruf nur mit _progress_lock)"""
+        if self._progress_timer is None:
+            self._progress_timer = threading.Timer(PROGRESS_FLUSH_DELAY, self._flush_progress)
+            self._progress_timer.daemon = True
+            self._progress_timer.start()
+    
+    def _flush_progress(self):
+        """Schreibt alle zurückgehaltenen Fortschritts-Updates"""
+        # Einreihen unter dem Lock, damit mark_job_* erst danach in die Queue des Jobs kommt
+        with self._progress_lock:
+            self._progress_timer = None
+            pending, self._pending_progress = self._pending_progress, {}
+            now = time.monotonic()
+            now_iso = _utc_now_iso()
+            for job_id, (progress, status) in pending.items():
+                self._progress_state[job_id] = (progress, now, status)
+                _submit_write(job_id, self._write_job_progress, job_id, progress, status, now_iso)
+    
+    def _discard_progress(self, job_id: str) -> Optional[Tuple[int, str]]:
+        """Entfernt den Fortschritts-Puffer eines beendeten Jobs und gibt ein ungeschriebenes Update zurück"""
+        with self._progress_lock:
+            self._progress_state.pop(job_id, None)
+            return self._pending_progress.pop(job_id, None)
+    
+    def _write_job_progress(self, job_id: str, progress: int, status: str, now_iso: Optional[str] = None):
+        """Schreibt Fortschritt und Status eines Jobs nach analysis_jobs"""
         try:
+            now_iso = now_iso or _utc_now_iso()
             update_data = {
                 'progress': progress,
                 'status': status,
-                'updated_at': datetime.utcnow().isoformat()
+                'updated_at': now_iso
             }
             
             if status == 'completed':
-                update_data['completed_at'] = datetime.utcnow().isoformat()
-                
-            self.client.table('analysis_jobs').update(update_data).eq('id', job_id).execute()
+                update_data['completed_at'] = now_iso
+            
+            if not _pg_write(_PG_PROGRESS_SQL, [(progress, status, now_iso, update_data.get('completed_at'), job_id)]):
+                _execute_with_retry(self.client.table('analysis_jobs').update(update_data, returning='minimal').eq('id', job_id))
+            _invalidate_job_status(job_id)
             logger.debug(f"Job {job_id} Progress: {progress}%")
             
         except Exception as e:
@@ -127,34 +526,23 @@ class SupabaseService:
         try:
             logger.info(f"💾 Versuche Modul-Ergebnis zu speichern: {module_name} für Job {job_id}")
             
-            # Prüfe ob Eintrag bereits existiert
-            existing_query = self.client.table('analysis_results').select('id').eq('job_id', job_id).eq('module_name', module_name)
-            if user_id:
-                existing_query = existing_query.eq('user_id', user_id)
-            existing = existing_query.execute()
-            
             result_data = {
                 'job_id': job_id,
                 'module_name': module_name,
                 'status': 'completed',
                 'result': result,
                 'token_usage': token_usage,
-                'completed_at': datetime.utcnow().isoformat()
+                'completed_at': _utc_now_iso()
             }
             if user_id:
                 result_data['user_id'] = user_id
             
-            if existing.data:
-                # Update existing
-                logger.info(f"🔄 Aktualisiere existierenden Eintrag für {module_name}")
-                update_query = self.client.table('analysis_results').update(result_data).eq('id', existing.data[0]['id'])
-                update_result = update_query.execute()
-                logger.info(f"✅ Update-Ergebnis: {update_result.data}")
-            else:
-                # Insert new
-                logger.info(f"➕ Erstelle neuen Eintrag für {module_name}")
-                insert_result = self.client.table('analysis_results').insert(result_data).execute()
-                logger.info(f"✅ Insert-Ergebnis: {insert_result.data}")
+            # Insert oder Update in einem Request (Unique-Index auf job_id, module_name, user_id)
+            if not _pg_upsert_module_rows([result_data]):
+                upsert_result = _execute_with_retry(self.client.table('analysis_results').upsert(
+                    result_data, on_conflict=MODULE_RESULT_CONFLICT_COLUMNS
+                ))
+                logger.info(f"✅ Upsert-Ergebnis: {upsert_result.data}")
                 
             logger.info(f"✅ Modul-Ergebnis erfolgreich gespeichert: {module_name} für Job {job_id}, User: {user_id}")
             
@@ -167,33 +555,145 @@ class SupabaseService:
         if not self.client:
             return
             
+        error_data = {
+            'job_id': job_id,
+            'module_name': module_name,
+            'status': 'failed',
+            'error': error,
+            'completed_at': _utc_now_iso()
+        }
+        if user_id:
+            error_data['user_id'] = user_id
+        
+        _submit_write(job_id, self._do_save_module_error, error_data)
+
+    def _do_save_module_error(self, error_data: Dict[str, Any]):
+        """Schreibt einen Modul-Fehler nach analysis_results (läuft im Write-Executor)"""
+        job_id = error_data['job_id']
+        module_name = error_data['module_name']
+        user_id = error_data.get('user_id')
         try:
-            error_data = {
+            if not _pg_upsert_module_rows([error_data]):
+                _execute_with_retry(self.client.table('analysis_results').upsert(
+                    error_data, on_conflict=MODULE_RESULT_CONFLICT_COLUMNS, returning='minimal'
+                ))
+                
+            logger.error(f"Modul-Fehler gespeichert: {module_name} für Job {job_id}, User: {user_id}")
+            
+        except Exception as e:
+            logger.error(f"Fehler beim Speichern des Modul-Fehlers: {e}")
+
+    def save_module_results_bulk(self, job_id: str, results: List[Dict[str, Any]], user_id: Optional[str] = None):
+        """
+        Speichert mehrere Modul-Ergebnisse eines Jobs mit einem Upsert pro Chunk
+        
+        Args:
+            job_id: Job ID
+            results: Einträge mit 'module_name' und entweder 'result'/'token_usage' oder 'error'
+            user_id: User ID (optional)
+        """
+        if not self.client:
+            logger.error(f"❌ Supabase Client nicht verfügbar - kann {len(results)} Modul-Ergebnisse nicht speichern!")
+            return
+        
+        completed_at = _utc_now_iso()
+        # PostgREST verlangt bei Array-Upserts identische Spalten in allen Zeilen
+        rows = [
+            {
                 'job_id': job_id,
-                'module_name': module_name,
-                'status': 'failed',
-                'error': error,
-                'completed_at': datetime.utcnow().isoformat()
+                'module_name': entry['module_name'],
+                'status': 'failed' if entry.get('error') is not None else 'completed',
+                'result': entry.get('result'),
+                'token_usage': entry.get('token_usage', 0),
+                'error': entry.get('error'),
+                'completed_at': completed_at,
+                'user_id': user_id
             }
-            if user_id:
-                error_data['user_id'] = user_id
+            for entry in results
+        ]
+        
+        try:
+            if _pg_upsert_module_rows(rows):
+                logger.info(f"✅ {len(rows)} Modul-Ergebnisse direkt gespeichert für Job {job_id}, User: {user_id}")
+                return
             
-            # Prüfe ob Eintrag bereits existiert
-            existing_query = self.client.table('analysis_results').select('id').eq('job_id', job_id).eq('module_name', module_name)
-            if user_id:
-                existing_query = existing_query.eq('user_id', user_id)
-            existing = existing_query.execute()
+            for start in range(0, len(rows), MODULE_RESULT_BULK_CHUNK):
+                _execute_with_retry(self.client.table('analysis_results').upsert(
+                    rows[start:start + MODULE_RESULT_BULK_CHUNK], on_conflict=MODULE_RESULT_CONFLICT_COLUMNS,
+                    returning='minimal'
+                ))
+            logger.info(f"✅ {len(rows)} Modul-Ergebnisse gespeichert für Job {job_id}, User: {user_id}")
             
-            if existing.data:
-                update_query = self.client.table('analysis_results').update(error_data).eq('id', existing.data[0]['id'])
-                update_query.execute()
-            else:
-                self.client.table('analysis_results').insert(error_data).execute()
-                
-            logger.error(f"Modul-Fehler gespeichert: {module_name} für Job {job_id}, User: {user_id}")
+        except Exception as e:
+            logger.error(f"❌ Fehler beim Speichern der Modul-Ergebnisse für Job {job_id}: {e}")
+
+    def bulk_seed_results(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Schreibt große Mengen Modul-Ergebnisse (Reprocessing, Seeding) per COPY nach analysis_results
+        
+        COPY fügt nur ein - bereits vorhandene (job_id, module_name, user_id) brechen den
+        Import ab. Ohne direkten Postgres-Zugriff wird per PostgREST-Upsert in Chunks geschrieben.
+        
+        Args:
+            rows: Einträge mit job_id, module_name, result und optional status, token_usage,
+                user_id, completed_at
+            
+        Returns:
+            Anzahl geschriebener Zeilen
+        """
+        completed_at = _utc_now_iso()
+        records = [
+            (
+                row['job_id'],
+                row['module_name'],
+                row.get('status', 'completed'),
+                row.get('result'),
+                row.get('token_usage', 0),
+                row.get('user_id'),
+                row.get('completed_at') or completed_at
+            )
+            for row in rows
+        ]
+        if not records:
+            return 0
+        
+        pool = _get_pg_pool()
+        if pool is not None:
+            try:
+                with pool.connection() as conn:
+                    with conn.cursor() as cur:
+                        with cur.copy(f"COPY analysis_results ({', '.join(_SEED_COLUMNS)}) FROM STDIN") as copy:
+                            for record in records:
+                                copy.write_row(
+                                    record[:3] + (Jsonb(record[3]) if record[3] is not None else None,) + record[4:]
+                                )
+                logger.info(f"✅ {len(records)} Modul-Ergebnisse per COPY importiert")
+                return len(records)
+            except _PG_CONNECTION_ERRORS as e:
+                # Postgres nicht erreichbar - Pfad abschalten und unten über PostgREST importieren
+                logger.warning(f"COPY-Import nicht möglich, nutze PostgREST: {e}")
+                _disable_pg_pool()
+            except Exception as e:
+                logger.error(f"❌ COPY-Import der Modul-Ergebnisse fehlgeschlagen: {e}")
+                return 0
+        
+        if not self.client:
+            logger.error(f"❌ Supabase Client nicht verfügbar - kann {len(records)} Modul-Ergebnisse nicht importieren!")
+            return 0
+        
+        try:
+            for start in range(0, len(records), MODULE_RESULT_BULK_CHUNK):
+                _execute_with_retry(self.client.table('analysis_results').upsert(
+                    [dict(zip(_SEED_COLUMNS, record)) for record in records[start:start + MODULE_RESULT_BULK_CHUNK]],
+                    on_conflict=MODULE_RESULT_CONFLICT_COLUMNS,
+                    returning='minimal'
+                ))
+            logger.info(f"✅ {len(records)} Modul-Ergebnisse per PostgREST importiert")
+            return len(records)
             
         except Exception as e:
-            logger.error(f"Fehler beim Speichern des Modul-Fehlers: {e}")
+            logger.error(f"❌ Import der Modul-Ergebnisse fehlgeschlagen: {e}")
+            return 0
 
     def save_final_report(self, job_id: str, report_data: Dict[str, Any]):
         """Speichert den finalen Analyse-Bericht direkt im analysis_jobs result Feld"""
@@ -205,19 +705,13 @@ class SupabaseService:
             logger.debug(f"Speichere finalen Bericht für Job {job_id} im result Feld")
             
             # Speichere den Bericht direkt im result Feld des Jobs
-            report_summary = {
-                'final_report': report_data,
-                'conformance_level': report_data.get('conformance_level'),
-                'overall_score': report_data.get('overall_score', 0),
-                'total_issues': report_data.get('total_issues', 0),
-                'critical_issues': report_data.get('critical_issues', 0),
-                'generated_at': datetime.utcnow().isoformat()
-            }
+            report_summary = self._build_report_summary(report_data)
             
             # Update den Job mit dem Bericht
-            self.client.table('analysis_jobs').update({
+            _execute_with_retry(self.client.table('analysis_jobs').update({
                 'result': report_summary
-            }).eq('id', job_id).execute()
+            }, returning='minimal').eq('id', job_id))
+            _invalidate_job_status(job_id)
             
             logger.debug(f"Finaler Bericht erfolgreich im Job {job_id} gespeichert")
             
@@ -225,18 +719,72 @@ class SupabaseService:
             logger.error(f"Fehler beim Speichern des Berichts für Job {job_id}: {str(e)}")
             logger.debug("Details zum Fehler:", exc_info=True)
 
+    def finalize_job(self, job_id: str, report_data: Dict[str, Any]):
+        """
+        Speichert den finalen Bericht und markiert den Job als abgeschlossen - atomar in
+        einem Request über die Postgres-Funktion finalize_job (supabase_performance_migration.sql)
+        """
+        if not self.client:
+            logger.warning("Supabase-Client nicht verfügbar - kann Job nicht abschließen")
+            return
+        
+        # Zurückgehaltener Fortschritt ist durch progress=100 überholt
+        self._discard_progress(job_id)
+        
+        # Über den Write-Executor, damit noch eingereihte Fortschritts-Writes vorher ankommen
+        _submit_write(job_id, self._do_finalize_job, job_id, report_data)
+
+    def _do_finalize_job(self, job_id: str, report_data: Dict[str, Any]):
+        """Ruft finalize_job per RPC auf (läuft im Write-Executor)"""
+        try:
+            _execute_with_retry(self.client.rpc('finalize_job', {
+                'p_job': job_id,
+                'p_report': self._build_report_summary(report_data)
+            }))
+            _invalidate_job_status(job_id)
+            logger.debug(f"Job {job_id} mit finalem Bericht abgeschlossen")
+            
+        except Exception as e:
+            # z.B. Migration noch nicht eingespielt - auf die zwei Einzel-Updates ausweichen
+            logger.warning(f"finalize_job RPC fehlgeschlagen für Job {job_id}, speichere einzeln: {e}")
+            self.save_final_report(job_id, report_data)
+            self.mark_job_completed(job_id)
+
+    @staticmethod
+    def _build_report_summary(report_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Baut den Inhalt des result Felds aus dem finalen Bericht"""
+        return {
+            'final_report': report_data,
+            'conformance_level': report_data.get('conformance_level'),
+            'overall_score': report_data.get('overall_score', 0),
+            'total_issues': report_data.get('total_issues', 0),
+            'critical_issues': report_data.get('critical_issues', 0),
+            'generated_at': _utc_now_iso()
+        }
+
     def mark_job_failed(self, job_id: str, error_message: str):
         """Markiert einen Job als fehlgeschlagen"""
         if not self.client:
             logger.warning("Supabase-Client nicht verfügbar - kann Job-Status nicht aktualisieren")
             return
             
+        # Zurückgehaltenen Fortschritt mit dem Fehlerstatus zusammen schreiben
+        pending = self._discard_progress(job_id)
+        
+        update_data = {
+            'status': 'failed',
+            'error': error_message,
+            'completed_at': _utc_now_iso()
+        }
+        if pending:
+            update_data['progress'] = pending[0]
+        _submit_write(job_id, self._do_mark_job_failed, job_id, update_data)
+
+    def _do_mark_job_failed(self, job_id: str, update_data: Dict[str, Any]):
+        """Schreibt den Fehlerstatus eines Jobs (läuft im Write-Executor)"""
         try:
-            self.client.table('analysis_jobs').update({
-                'status': 'failed',
-                'error': error_message,
-                'completed_at': datetime.now().isoformat()
-            }).eq('id', job_id).execute()
+            _execute_with_retry(self.client.table('analysis_jobs').update(update_data, returning='minimal').eq('id', job_id))
+            _invalidate_job_status(job_id)
             logger.debug(f"Job {job_id} als fehlgeschlagen markiert")
         except Exception as e:
             logger.error(f"Fehler beim Markieren des Jobs als fehlgeschlagen: {e}")
@@ -247,12 +795,20 @@ class SupabaseService:
             logger.warning("Supabase-Client nicht verfügbar - kann Job-Status nicht aktualisieren")
             return
             
+        # Zurückgehaltener Fortschritt ist durch progress=100 überholt
+        self._discard_progress(job_id)
+        
+        _submit_write(job_id, self._do_mark_job_completed, job_id, _utc_now_iso())
+
+    def _do_mark_job_completed(self, job_id: str, completed_at: str):
+        """Schreibt den Abschluss-Status eines Jobs (läuft im Write-Executor)"""
         try:
-            self.client.table('analysis_jobs').update({
+            _execute_with_retry(self.client.table('analysis_jobs').update({
                 'status': 'completed',
                 'progress': 100,
-                'completed_at': datetime.now().isoformat()
-            }).eq('id', job_id).execute()
+                'completed_at': completed_at
+            }, returning='minimal').eq('id', job_id))
+            _invalidate_job_status(job_id)
             logger.debug(f"Job {job_id} als erfolgreich abgeschlossen markiert")
         except Exception as e:
             logger.error(f"Fehler beim Markieren des Jobs als abgeschlossen: {e}")
@@ -262,12 +818,23 @@ class SupabaseService:
         if not self.client:
             return None
             
+        now = time.monotonic()
+        with _job_status_cache_lock:
+            cached = _job_status_cache.get(job_id)
+        if cached and cached[0] > now:
+            return dict(cached[1]) if cached[1] is not None else None
+            
         try:
-            response = self.client.table('analysis_jobs').select('*').eq('id', job_id).execute()
+            response = self.client.table('analysis_jobs').select(JOB_STATUS_COLUMNS).eq('id', job_id).execute()
+            job = response.data[0] if response.data else None
             
-            if response.data:
-                return response.data[0]
-            return None
+            with _job_status_cache_lock:
+                if len(_job_status_cache) >= JOB_STATUS_CACHE_MAXSIZE and job_id not in _job_status_cache:
+                    _job_status_cache.pop(next(iter(_job_status_cache)))
+                _job_status_cache[job_id] = (now + JOB_STATUS_CACHE_TTL, job)
+            
+            # Kopie zurückgeben, damit Aufrufer den Cache-Eintrag nicht verändern
+            return dict(job) if job is not None else None
             
         except Exception as e:
             logger.error(f"Fehler beim Abrufen des Job-Status: {e}")
@@ -280,45 +847,140 @@ class SupabaseService:
             
         try:
             # Hole Job-Details mit result Feld (enthält den finalen Bericht)
-            job = self.get_job_status(job_id)
+            job = self._fetch_job(job_id)
             
             # Hole alle Modul-Ergebnisse
-            results_response = self.client.table('analysis_results').select('*').eq('job_id', job_id).execute()
+            results_response = self._fetch_module_results(job_id)
             
-            # Extrahiere finalen Bericht aus dem job result Feld
-            final_report = None
-            if job and job.get('result'):
-                final_report = job['result'].get('final_report') if isinstance(job['result'], dict) else None
+            return self._build_job_results(job, results_response)
             
-            return {
-                'job': job,
-                'modules': results_response.data if results_response.data else [],
-                'report': final_report  # Finaler Bericht aus job.result statt separater Tabelle
-            }
+        except Exception as e:
+            logger.error(f"Fehler beim Abrufen der Job-Ergebnisse: {e}")
+            return {}
+
+    async def get_job_results_async(self, job_id: str) -> Dict[str, Any]:
+        """Async-Variante von get_job_results - Job und Modul-Ergebnisse werden parallel geladen"""
+        if not self.client:
+            return {}
+        
+        try:
+            job, results_response = await asyncio.gather(
+                asyncio.to_thread(self._fetch_job, job_id),
+                asyncio.to_thread(self._fetch_module_results, job_id)
+            )
+            return self._build_job_results(job, results_response)
             
         except Exception as e:
             logger.error(f"Fehler beim Abrufen der Job-Ergebnisse: {e}")
             return {}
 
-    def get_user_jobs(self, user_id: str, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
-        """Holt alle Jobs eines Users"""
+    def _fetch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Lädt die vollständige Job-Zeile inklusive result Feld - vom primären Client wie
+        get_job_status, damit direkt nach finalize_job keine veralteten Replica-Daten kommen
+        """
+        response = self.client.table('analysis_jobs').select('*').eq('id', job_id).execute()
+        return response.data[0] if response.data else None
+
+    def _fetch_module_results(self, job_id: str):
+        """Lädt alle Modul-Ergebnisse eines Jobs (primärer Client, siehe _fetch_job)"""
+        return self.client.table('analysis_results').select('*').eq('job_id', job_id).execute()
+
+    @staticmethod
+    def _build_job_results(job: Optional[Dict[str, Any]], results_response) -> Dict[str, Any]:
+        """Setzt Job, Modul-Ergebnisse und finalen Bericht zum Ergebnis von get_job_results zusammen"""
+        # Extrahiere finalen Bericht aus dem job result Feld
+        final_report = None
+        if job and job.get('result'):
+            final_report = job['result'].get('final_report') if isinstance(job['result'], dict) else None
+        
+        return {
+            'job': job,
+            'modules': results_response.data if results_response.data else [],
+            'report': final_report  # Finaler Bericht aus job.result statt separater Tabelle
+        }
+
+    def get_user_jobs(self, user_id: str, limit: int = 10, offset: int = 0, exact_count: bool = False) -> Dict[str, Any]:
+        """
+        Holt alle Jobs eines Users
+        
+        Die Gesamtanzahl ist standardmäßig geschätzt (PostgREST count=estimated: exakt bei
+        kleinen Mengen, sonst aus dem Query-Planer); exact_count=True erzwingt count(*).
+        """
         if not self.client:
             return {'jobs': [], 'total': 0}
             
         try:
-            # Hole Jobs des Users
-            response = self.client.table('analysis_jobs').select('*').eq('user_id', user_id).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+            # Jobs und Gesamtanzahl (Content-Range) in einem Request
+            response = self._fetch_user_jobs_page(user_id, limit, offset, exact_count)
             
-            # Hole Gesamtanzahl
-            count_response = self.client.table('analysis_jobs').select('id', count='exact').eq('user_id', user_id).execute()
-            
-            return {
-                'jobs': response.data if response.data else [],
-                'total': count_response.count if count_response.count else 0,
-                'limit': limit,
-                'offset': offset
-            }
+            return self._build_user_jobs(response, limit, offset)
             
         except Exception as e:
             logger.error(f"Fehler beim Abrufen der User-Jobs: {e}")
-            return {'jobs': [], 'total': 0} 
\ No newline at end of file
+            return {'jobs': [], 'total': 0}
+
+    async def get_user_jobs_async(self, user_id: str, limit: int = 10, offset: int = 0, exact_count: bool = False) -> Dict[str, Any]:
+        """Async-Variante von get_user_jobs (Request läuft in einem Worker-Thread)"""
+        return await asyncio.to_thread(self.get_user_jobs, user_id, limit, offset, exact_count)
+
+    def _fetch_user_jobs_page(self, user_id: str, limit: int, offset: int, exact_count: bool = False):
+        """Lädt eine Seite der Jobs eines Users (neueste zuerst) samt Gesamtanzahl"""
+        count_method = 'exact' if exact_count else 'estimated'
+        return self.read_client.table('analysis_jobs').select(USER_JOBS_COLUMNS, count=count_method).eq('user_id', user_id).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+
+    @staticmethod
+    def _build_user_jobs(response, limit: int, offset: int) -> Dict[str, Any]:
+        """Setzt das Ergebnis von get_user_jobs zusammen"""
+        return {
+            'jobs': response.data if response.data else [],
+            'total': response.count if response.count else 0,
+            'limit': limit,
+            'offset': offset
+        }
+
+    def claim_webhook_event(self, event_id: str, event_type: str) -> bool:
+        """
+        Trägt ein Stripe-Webhook-Event in stripe_webhook_events ein (Primary Key event_id).
+        
+        Der Eintrag ist prozessübergreifend - auch auf Serverless/mehreren Workern wird eine
+        erneute Zustellung so nur einmal verarbeitet.
+        
+        Returns:
+            True beim ersten Auftreten, False wenn die Event-ID bereits eingetragen ist
+        """
+        if not self.client:
+            logger.warning("Supabase-Client nicht verfügbar - Webhook-Event %s wird ohne Deduplizierung verarbeitet", event_id)
+            return True
+        
+        try:
+            self.client.table('stripe_webhook_events').insert({
+                'event_id': event_id,
+                'event_type': event_type
+            }, returning='minimal').execute()
+            return True
+        except Exception as e:
+            # 23505 = unique_violation: Event wurde bereits (von einem anderen Prozess) verarbeitet
+            if getattr(e, 'code', None) == '23505':
+                return False
+            # Lieber doppelt verarbeiten als eine bezahlte Analyse verlieren
+            logger.error("Fehler beim Eintragen des Webhook-Events %s: %s", event_id, e)
+            return True
+
+    def release_webhook_event(self, event_id: str) -> None:
+        """Entfernt ein Webhook-Event wieder, damit eine Stripe-Wiederholung erneut verarbeitet wird"""
+        if not self.client:
+            return
+        
+        try:
+            self.client.table('stripe_webhook_events').delete(returning='minimal').eq('event_id', event_id).execute()
+        except Exception as e:
+            logger.error("Fehler beim Freigeben des Webhook-Events %s: %s", event_id, e)
+
+    async def claim_webhook_event_async(self, event_id: str, event_type: str) -> bool:
+        """Async-Variante von claim_webhook_event (Request läuft in einem Worker-Thread)"""
+        return await asyncio.to_thread(self.claim_webhook_event, event_id, event_type)
+
+    async def release_webhook_event_async(self, event_id: str) -> None:
+        """Async-Variante von release_webhook_event (Request läuft in einem Worker-Thread)"""
+        await asyncio.to_thread(self.release_webhook_event, event_id)
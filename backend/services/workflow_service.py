@@ -1,18 +1,293 @@
 import os
+import re
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
-from datetime import datetime
-from .supabase_service import SupabaseService
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, List, NamedTuple, Tuple, Union
+from concurrent.futures import Future
+from functools import wraps
+from .supabase_service import SupabaseService, _utc_now_iso
 
 logger = logging.getLogger(__name__)
 
+
+_supabase: Optional[SupabaseService] = None
+_supabase_lock = threading.Lock()
+
+
+def _get_supabase() -> SupabaseService:
+    """
+    Prozessweit geteilte SupabaseService-Instanz für den Workflow Service.
+    
+    Gemerkt wird sie erst, wenn ein Client verfügbar ist - im Offline-Modus bekommt jeder
+    Aufruf eine neue Instanz, die beim nächsten Mal erneut initialisieren kann.
+    """
+    global _supabase
+    if _supabase is not None:
+        return _supabase
+    
+    with _supabase_lock:
+        if _supabase is not None:
+            return _supabase
+        
+        service = SupabaseService()
+        if service.client:
+            _supabase = service
+        return service
+
+
+# Select-Strings der Listen-Queries (ohne Leerzeichen, einmal beim Import gebaut)
+# WORKFLOW_LIST_COLUMNS allein für expand=False, sonst mit Auftrag und Profilen als Embeds
+WORKFLOW_LIST_COLUMNS = 'id,current_stage,web_development_status,certification_status,created_at,updated_at,job_id,customer_id'
+DEVELOPER_LIST_SELECT = (
+    WORKFLOW_LIST_COLUMNS
+    + ',analysis_jobs(url,plan,status,created_at)'
+    + ',customer_profile:user_profiles!customer_id(full_name,company)'
+)
+CERTIFIER_LIST_SELECT = (
+    DEVELOPER_LIST_SELECT
+    + ',web_developer_profile:user_profiles!web_developer_id(full_name,company)'
+)
+
+# Seitengröße für get_projects_for_developer/_certifier (Keyset-Pagination über updated_at, id)
+PROJECTS_PAGE_LIMIT = 50
+
+
+# Erlaubte Zeichen eines Timestamps im Cursor (Postgres-JSON, z.B. 2026-10-17T15:21:12.29+00:00)
+_CURSOR_TIMESTAMP_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[T ][0-9:.+\-]+$')
+
+
+def _encode_projects_cursor(project: Dict[str, Any]) -> str:
+    """Cursor aus dem letzten Projekt einer Seite: 'updated_at|id'"""
+    return f"{project['updated_at']}|{project['id']}"
+
+
+def _decode_projects_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Zerlegt einen Cursor in (updated_at, id). Beide Werte werden validiert, da sie
+    in den or_-Filter eingesetzt werden; ungültige Cursor werfen ValueError.
+    """
+    updated_at, _, workflow_id = cursor.partition('|')
+    if not _CURSOR_TIMESTAMP_RE.match(updated_at):
+        raise ValueError(f"Ungültiger Cursor: {cursor}")
+    uuid.UUID(workflow_id)
+    return updated_at, workflow_id
+
+
+def _apply_projects_cursor(query, cursor: Optional[str], limit: int):
+    """Sortierung (updated_at, id) absteigend plus Keyset-Filter für die Seite nach dem Cursor"""
+    if cursor:
+        updated_at, workflow_id = _decode_projects_cursor(cursor)
+        # Zeilen mit gleichem updated_at werden über die id getrennt, damit keine verloren gehen
+        query = query.or_(
+            f'updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",id.lt.{workflow_id})'
+        )
+    # Gleiche Reihenfolge wie der Cursor-Vergleich: erst updated_at, dann id
+    return query.order('updated_at', desc=True).order('id', desc=True).limit(limit)
+
+# Kurzlebiger Cache für die Listen verfügbarer Projekte: (Rolle, expand, count_mode) -> (Ablaufzeit, Projekte, Anzahl)
+# Dashboards pollen diese Listen ständig; jede Zuweisung oder Statusänderung leert den Cache
+AVAILABLE_PROJECTS_CACHE_TTL = 10.0
+_available_projects_cache: Dict[tuple, Tuple[float, List[Dict[str, Any]], int]] = {}
+_available_projects_cache_lock = threading.Lock()
+
+
+def _get_cached_available_projects(key: tuple) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+    """Liefert die gecachte Projektliste samt Anzahl oder None, wenn abgelaufen"""
+    with _available_projects_cache_lock:
+        cached = _available_projects_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return list(cached[1]), cached[2]
+    return None
+
+
+def _store_available_projects(key: tuple, projects: List[Dict[str, Any]], count: int) -> None:
+    with _available_projects_cache_lock:
+        _available_projects_cache[key] = (time.monotonic() + AVAILABLE_PROJECTS_CACHE_TTL, projects, count)
+
+
+def _invalidate_available_projects() -> None:
+    """Leert den Cache (nach Writes, die die Sichtbarkeit in den Listen ändern können)"""
+    with _available_projects_cache_lock:
+        _available_projects_cache.clear()
+
+
+# Cache für die Projektlisten pro User: (Rolle, user_id) -> {(expand, limit, cursor): (Ablaufzeit, Projekte)}
+# Wird bei Zuweisungen und Statusänderungen für die beteiligten User geleert; die Zuordnung
+# Workflow -> Beteiligte stammt aus den zuletzt geladenen Listen
+PROJECTS_CACHE_TTL = 30.0
+PROJECTS_CACHE_MAXSIZE = 1024
+_projects_cache: Dict[Tuple[str, str], Dict[tuple, Tuple[float, List[Dict[str, Any]]]]] = {}
+_workflow_participants: Dict[str, Dict[str, str]] = {}
+_projects_cache_lock = threading.Lock()
+
+
+def _get_cached_projects(role: str, user_id: str, variant: tuple) -> Optional[List[Dict[str, Any]]]:
+    """Liefert eine gecachte Projektseite oder None, wenn abgelaufen"""
+    with _projects_cache_lock:
+        cached = _projects_cache.get((role, user_id), {}).get(variant)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+
+def _store_projects(role: str, user_id: str, variant: tuple, projects: List[Dict[str, Any]]) -> None:
+    with _projects_cache_lock:
+        key = (role, user_id)
+        if len(_projects_cache) >= PROJECTS_CACHE_MAXSIZE and key not in _projects_cache:
+            _projects_cache.pop(next(iter(_projects_cache)))
+        _projects_cache.setdefault(key, {})[variant] = (time.monotonic() + PROJECTS_CACHE_TTL, projects)
+        
+        for project in projects:
+            workflow_id = project.get('id')
+            if workflow_id is None:
+                continue
+            if len(_workflow_participants) >= PROJECTS_CACHE_MAXSIZE and workflow_id not in _workflow_participants:
+                _workflow_participants.pop(next(iter(_workflow_participants)))
+            _workflow_participants.setdefault(workflow_id, {})[role] = user_id
+
+
+def _invalidate_projects(workflow_id: str, **participants: Optional[str]) -> None:
+    """
+    Leert die Projektlisten aller bekannten Beteiligten eines Workflows sowie der explizit
+    übergebenen User (z.B. developer=... bei einer neuen Zuweisung)
+    """
+    with _projects_cache_lock:
+        known = _workflow_participants.get(workflow_id, {})
+        for role, user_id in list(known.items()) + list(participants.items()):
+            if user_id:
+                _projects_cache.pop((role, user_id), None)
+        for role, user_id in participants.items():
+            if user_id:
+                _workflow_participants.setdefault(workflow_id, {})[role] = user_id
+
+
+# Laufende Listen-Requests: ('developer'|'certifier', user_id, expand, limit, cursor) -> Future der Supabase-Response
+# Gleichzeitige Aufrufe für denselben User (mehrere Dashboard-Widgets) teilen sich einen Request
+_inflight_requests: Dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _execute_deduplicated(key: tuple, query):
+    """
+    Führt query.execute() aus oder wartet auf einen bereits laufenden Request mit gleichem Key.
+    Es wird nichts über das Request-Ende hinaus gecacht - nur parallele Aufrufe werden gebündelt.
+    """
+    with _inflight_lock:
+        future = _inflight_requests.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _inflight_requests[key] = future
+    
+    if not is_owner:
+        return future.result()
+    
+    try:
+        result = query.execute()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_requests.pop(key, None)
+
+
+class MessagePayload(NamedTuple):
+    """Nachricht für send_messages (Felder wie die Argumente von send_message)"""
+    workflow_id: str
+    sender_id: str
+    recipient_id: str
+    message_type: str
+    subject: str
+    message: str
+    attachments: Optional[List[str]] = None
+    
+    def to_row(self) -> Dict[str, Any]:
+        """project_communications-Zeile für den Insert (created_at setzt die Datenbank)"""
+        return {
+            'workflow_id': self.workflow_id,
+            'sender_id': self.sender_id,
+            'recipient_id': self.recipient_id,
+            'message_type': self.message_type,
+            'subject': self.subject,
+            'message': self.message,
+            'attachments': self.attachments or [],
+            'is_read': False
+        }
+
+
+def requires_client(default):
+    """
+    Decorator für WorkflowService-Methoden: ohne Supabase Client wird die Methode nicht
+    ausgeführt, sondern default zurückgegeben (Callables wie list werden pro Aufruf
+    aufgerufen, damit kein veränderbarer Default geteilt wird)
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.supabase.client:
+                return func(self, *args, **kwargs)
+            logger.debug("Supabase Client nicht verfügbar - %s übersprungen", func.__name__)
+            return default() if callable(default) else default
+        return wrapper
+    return decorator
+
+
+def _empty_projects_page() -> Dict[str, Any]:
+    return {'projects': [], 'next_cursor': None}
+
+
+# Maximale Anzahl paralleler Workflow-Requests pro Worker aus den async-Varianten
+WORKFLOW_MAX_CONCURRENCY = 20
+
+# Semaphore wird erst im laufenden Event Loop angelegt (siehe _run_in_thread)
+_workflow_concurrency: Optional[asyncio.Semaphore] = None
+
+
+async def _run_in_thread(func, *args):
+    """
+    Führt einen blockierenden Supabase-Call in einem Worker-Thread aus, damit der
+    Event Loop frei bleibt. Begrenzt auf WORKFLOW_MAX_CONCURRENCY parallele Calls.
+    """
+    global _workflow_concurrency
+    if _workflow_concurrency is None:
+        _workflow_concurrency = asyncio.Semaphore(WORKFLOW_MAX_CONCURRENCY)
+    async with _workflow_concurrency:
+        return await asyncio.to_thread(func, *args)
+
+
 class WorkflowService:
     """Service für Project Workflow Management"""
     
+    # Zusätzliche Felder je Zielstatus (Stage-Übergänge) und Spalte für den Abschluss-Zeitpunkt
+    _DEV_STATUS_PATCH: Dict[str, Dict[str, Any]] = {
+        'completed': {'current_stage': 'certification'}  # Weiterleitung zur Zertifizierung
+    }
+    _DEV_STATUS_TIMESTAMP: Dict[str, str] = {
+        'completed': 'web_development_completed_at'
+    }
+    _CERT_STATUS_PATCH: Dict[str, Dict[str, Any]] = {
+        'completed': {'current_stage': 'completed'},  # Projekt vollständig abgeschlossen
+        'testing': {'current_stage': 'certification'}
+    }
+    _CERT_STATUS_TIMESTAMP: Dict[str, str] = {
+        'completed': 'certification_completed_at'
+    }
+    
+    # Bekannte Status-Werte - nur diese werden ungequotet in den No-op-Filter (.or_) eingesetzt
+    _DEV_STATUSES = frozenset({'pending', 'assigned', 'in_progress', 'completed', 'rejected'})
+    _CERT_STATUSES = frozenset({'pending', 'assigned', 'testing', 'completed', 'rejected'})
+    
     def __init__(self):
-        self.supabase = SupabaseService()
+        self.supabase = _get_supabase()
         logger.info("Workflow Service initialisiert")
     
+    @requires_client(None)
     def create_project_workflow(
         self, 
         job_id: str, 
@@ -32,11 +307,8 @@ class WorkflowService:
         Returns:
             Workflow ID oder None bei Fehler
         """
-        if not self.supabase.client:
-            logger.warning("Supabase Client nicht verfügbar")
-            return None
-            
         try:
+            # created_at/updated_at setzt die Datenbank (DEFAULT now(), siehe workflow_performance_migration.sql)
             workflow_data = {
                 'job_id': job_id,
                 'customer_id': customer_id,
@@ -44,85 +316,122 @@ class WorkflowService:
                 'web_development_requested': web_development_requested,
                 'certification_requested': certification_requested,
                 'web_development_status': 'pending' if web_development_requested else None,
-                'certification_status': 'pending' if certification_requested else None,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
+                'certification_status': 'pending' if certification_requested else None
             }
             
             result = self.supabase.client.table('project_workflow').insert(workflow_data).execute()
             
             if result.data and len(result.data) > 0:
                 workflow_id = result.data[0]['id']
-                logger.info(f"Workflow erstellt: {workflow_id} für Job {job_id}")
+                _invalidate_available_projects()
+                logger.info("Workflow erstellt: %s für Job %s", workflow_id, job_id)
                 return workflow_id
             else:
-                logger.error(f"Fehler beim Erstellen des Workflows: {result}")
+                logger.error("Fehler beim Erstellen des Workflows: %s", result)
                 return None
                 
         except Exception as e:
-            logger.error(f"Fehler beim Erstellen des Workflows: {str(e)}")
+            logger.error("Fehler beim Erstellen des Workflows: %s", e)
             return None
     
-    def get_available_projects_for_developer(self) -> List[Dict[str, Any]]:
+    def get_available_projects_for_developer(
+        self,
+        expand: bool = True,
+        count_mode: Optional[str] = None
+    ) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], int]]:
         """
         Holt verfügbare Projekte für Webentwickler
         
+        Args:
+            expand: Auftrag und Kundenprofil mitladen (False für Zähler/Status-Anzeigen ohne Joins)
+            count_mode: 'exact', 'planned' oder 'estimated' - Gesamtanzahl im selben Request mitladen
+            
         Returns:
-            Liste von verfügbaren Projekten
+            Liste von verfügbaren Projekten, mit count_mode ein Tupel (Projekte, Anzahl)
         """
-        if not self.supabase.client:
-            return []
-            
-        try:
-            result = self.supabase.client.table('project_workflow')\
-                .select('''
-                    *,
-                    analysis_jobs(url, plan, status, created_at),
-                    customer_profile:user_profiles!customer_id(full_name, company)
-                ''')\
-                .eq('web_development_requested', True)\
-                .is_('web_developer_id', None)\
-                .eq('web_development_status', 'pending')\
-                .order('created_at', desc=False)\
-                .execute()
-            
-            return result.data or []
-            
-        except Exception as e:
-            logger.error(f"Fehler beim Laden verfügbarer Entwickler-Projekte: {str(e)}")
-            return []
+        projects, count = self._load_available_projects('developer', expand, count_mode)
+        return (projects, count) if count_mode else projects
     
-    def get_available_projects_for_certifier(self) -> List[Dict[str, Any]]:
+    def get_available_projects_for_certifier(
+        self,
+        expand: bool = True,
+        count_mode: Optional[str] = None
+    ) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], int]]:
         """
         Holt verfügbare Projekte für Zertifizierer
         
+        Args:
+            expand: Auftrag, Kunden- und Entwicklerprofil mitladen (False für Zähler/Status-Anzeigen ohne Joins)
+            count_mode: 'exact', 'planned' oder 'estimated' - Gesamtanzahl im selben Request mitladen
+            
         Returns:
-            Liste von verfügbaren Projekten
+            Liste von verfügbaren Projekten, mit count_mode ein Tupel (Projekte, Anzahl)
         """
-        if not self.supabase.client:
-            return []
+        projects, count = self._load_available_projects('certifier', expand, count_mode)
+        return (projects, count) if count_mode else projects
+    
+    @requires_client(lambda: ([], 0))
+    def _load_available_projects(
+        self,
+        role: str,
+        expand: bool,
+        count_mode: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Lädt die offenen Projekte für 'developer' oder 'certifier' (mit Cache)"""
+        cache_key = (role, expand, count_mode)
+        cached = _get_cached_available_projects(cache_key)
+        if cached is not None:
+            return cached
             
         try:
-            result = self.supabase.client.table('project_workflow')\
-                .select('''
-                    *,
-                    analysis_jobs(url, plan, status, created_at),
-                    customer_profile:user_profiles!customer_id(full_name, company),
-                    web_developer_profile:user_profiles!web_developer_id(full_name, company)
-                ''')\
-                .eq('certification_requested', True)\
-                .is_('certifier_id', None)\
-                .eq('certification_status', 'pending')\
-                .in_('current_stage', ['certification', 'web_development'])\
-                .order('created_at', desc=False)\
-                .execute()
+            query = self.supabase.client.table('project_workflow')
+            if role == 'developer':
+                query = query\
+                    .select(DEVELOPER_LIST_SELECT if expand else WORKFLOW_LIST_COLUMNS, count=count_mode)\
+                    .eq('web_development_requested', True)\
+                    .is_('web_developer_id', None)\
+                    .eq('web_development_status', 'pending')
+            else:
+                query = query\
+                    .select(CERTIFIER_LIST_SELECT if expand else WORKFLOW_LIST_COLUMNS, count=count_mode)\
+                    .eq('certification_requested', True)\
+                    .is_('certifier_id', None)\
+                    .eq('certification_status', 'pending')\
+                    .in_('current_stage', ['certification', 'web_development'])
+            
+            result = query.order('created_at', desc=False).execute()
             
-            return result.data or []
+            projects = result.data or []
+            count = result.count if result.count is not None else len(projects)
+            _store_available_projects(cache_key, projects, count)
+            return list(projects), count
             
         except Exception as e:
-            logger.error(f"Fehler beim Laden verfügbarer Zertifizierer-Projekte: {str(e)}")
-            return []
+            logger.error("Fehler beim Laden verfügbarer Projekte (%s): %s", role, e)
+            return [], 0
     
+    def get_all_available_projects(self, expand: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Holt die verfügbaren Projekte für Webentwickler und Zertifizierer (Admin-Dashboard)
+        
+        Returns:
+            Dict mit 'developer' und 'certifier' Projektlisten
+        """
+        return {
+            'developer': self.get_available_projects_for_developer(expand),
+            'certifier': self.get_available_projects_for_certifier(expand)
+        }
+    
+    def _workflow_exists(self, workflow_id: str) -> bool:
+        """Prüft, ob ein Workflow existiert (nur nach einem Update mit count=0 nötig)"""
+        result = self.supabase.client.table('project_workflow')\
+            .select('id')\
+            .eq('id', workflow_id)\
+            .limit(1)\
+            .execute()
+        return bool(result.data)
+    
+    @requires_client(False)
     def assign_developer_to_project(self, workflow_id: str, developer_id: str) -> bool:
         """
         Weist einen Webentwickler einem Projekt zu
@@ -132,34 +441,37 @@ class WorkflowService:
             developer_id: Entwickler User ID
             
         Returns:
-            True bei Erfolg
+            True bei Erfolg, False wenn der Workflow nicht existiert
         """
-        if not self.supabase.client:
-            return False
-            
         try:
+            now_iso = _utc_now_iso()
+            # return=minimal: kein Response-Body, die Zeilenzahl kommt über count=exact.
+            # postgrest-py < 2 liefert bei leerem Body immer count=0 - daher wird ein
+            # Count von 0 über _workflow_exists gegengeprüft statt direkt als Fehler gewertet
             result = self.supabase.client.table('project_workflow')\
                 .update({
                     'web_developer_id': developer_id,
                     'web_development_status': 'assigned',
-                    'web_development_started_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                })\
+                    'web_development_started_at': now_iso,
+                    'updated_at': now_iso
+                }, count='exact', returning='minimal')\
                 .eq('id', workflow_id)\
                 .execute()
             
-            success = result.data and len(result.data) > 0
-            if success:
-                logger.info(f"Entwickler {developer_id} dem Workflow {workflow_id} zugewiesen")
-            else:
-                logger.error(f"Fehler beim Zuweisen des Entwicklers: {result}")
+            if not result.count and not self._workflow_exists(workflow_id):
+                logger.warning("Workflow %s nicht gefunden", workflow_id)
+                return False
             
-            return success
+            _invalidate_available_projects()
+            _invalidate_projects(workflow_id, developer=developer_id)
+            logger.info("Entwickler %s dem Workflow %s zugewiesen", developer_id, workflow_id)
+            return True
             
         except Exception as e:
-            logger.error(f"Fehler beim Zuweisen des Entwicklers: {str(e)}")
+            logger.error("Fehler beim Zuweisen des Entwicklers: %s", e)
             return False
     
+    @requires_client(False)
     def assign_certifier_to_project(self, workflow_id: str, certifier_id: str) -> bool:
         """
         Weist einen Zertifizierer einem Projekt zu
@@ -169,35 +481,127 @@ class WorkflowService:
             certifier_id: Zertifizierer User ID
             
         Returns:
-            True bei Erfolg
+            True bei Erfolg, False wenn der Workflow nicht existiert
         """
-        if not self.supabase.client:
-            return False
-            
         try:
+            now_iso = _utc_now_iso()
             result = self.supabase.client.table('project_workflow')\
                 .update({
                     'certifier_id': certifier_id,
                     'certification_status': 'assigned',
-                    'certification_started_at': datetime.now().isoformat(),
+                    'certification_started_at': now_iso,
                     'current_stage': 'certification',
-                    'updated_at': datetime.now().isoformat()
-                })\
+                    'updated_at': now_iso
+                }, count='exact', returning='minimal')\
                 .eq('id', workflow_id)\
                 .execute()
             
-            success = result.data and len(result.data) > 0
+            if not result.count and not self._workflow_exists(workflow_id):
+                logger.warning("Workflow %s nicht gefunden", workflow_id)
+                return False
+            
+            _invalidate_available_projects()
+            _invalidate_projects(workflow_id, certifier=certifier_id)
+            logger.info("Zertifizierer %s dem Workflow %s zugewiesen", certifier_id, workflow_id)
+            return True
+            
+        except Exception as e:
+            logger.error("Fehler beim Zuweisen des Zertifizierers: %s", e)
+            return False
+    
+    def assign_developer_and_notify(
+        self,
+        workflow_id: str,
+        developer_id: str,
+        sender_id: str,
+        subject: str,
+        message: str
+    ) -> bool:
+        """
+        Weist einen Webentwickler zu und benachrichtigt ihn in einem Request
+        (RPC assign_developer_and_notify, siehe workflow_performance_migration.sql)
+        
+        Args:
+            workflow_id: Workflow ID
+            developer_id: Entwickler User ID (Empfänger der Nachricht)
+            sender_id: Absender User ID
+            subject: Betreff
+            message: Nachrichtentext
+            
+        Returns:
+            True bei Erfolg
+        """
+        return self._assign_and_notify(
+            'assign_developer_and_notify',
+            {
+                'p_workflow_id': workflow_id,
+                'p_developer_id': developer_id,
+                'p_sender_id': sender_id,
+                'p_subject': subject,
+                'p_message': message
+            },
+            "Entwickler %s dem Workflow %s zugewiesen und benachrichtigt", developer_id, workflow_id
+        )
+    
+    def assign_certifier_and_notify(
+        self,
+        workflow_id: str,
+        certifier_id: str,
+        sender_id: str,
+        subject: str,
+        message: str
+    ) -> bool:
+        """
+        Weist einen Zertifizierer zu und benachrichtigt ihn in einem Request
+        (RPC assign_certifier_and_notify, siehe workflow_performance_migration.sql)
+        
+        Args:
+            workflow_id: Workflow ID
+            certifier_id: Zertifizierer User ID (Empfänger der Nachricht)
+            sender_id: Absender User ID
+            subject: Betreff
+            message: Nachrichtentext
+            
+        Returns:
+            True bei Erfolg
+        """
+        return self._assign_and_notify(
+            'assign_certifier_and_notify',
+            {
+                'p_workflow_id': workflow_id,
+                'p_certifier_id': certifier_id,
+                'p_sender_id': sender_id,
+                'p_subject': subject,
+                'p_message': message
+            },
+            "Zertifizierer %s dem Workflow %s zugewiesen und benachrichtigt", certifier_id, workflow_id
+        )
+    
+    @requires_client(False)
+    def _assign_and_notify(self, function_name: str, params: Dict[str, Any], success_log: str, *log_args) -> bool:
+        """Führt eine Zuweisungs-RPC aus; die Funktion liefert die Nachrichten-ID oder NULL"""
+        try:
+            result = self.supabase.client.rpc(function_name, params).execute()
+            
+            success = bool(result.data)
             if success:
-                logger.info(f"Zertifizierer {certifier_id} dem Workflow {workflow_id} zugewiesen")
+                _invalidate_available_projects()
+                _invalidate_projects(
+                    params['p_workflow_id'],
+                    developer=params.get('p_developer_id'),
+                    certifier=params.get('p_certifier_id')
+                )
+                logger.info(success_log, *log_args)
             else:
-                logger.error(f"Fehler beim Zuweisen des Zertifizierers: {result}")
+                logger.error("Fehler bei %s: Workflow %s nicht gefunden", function_name, params['p_workflow_id'])
             
             return success
             
         except Exception as e:
-            logger.error(f"Fehler beim Zuweisen des Zertifizierers: {str(e)}")
+            logger.error("Fehler bei %s: %s", function_name, e)
             return False
     
+    @requires_client(False)
     def update_development_status(
         self, 
         workflow_id: str, 
@@ -213,41 +617,46 @@ class WorkflowService:
             notes: Optionale Notizen
             
         Returns:
-            True bei Erfolg
+            True bei Erfolg (auch wenn der Status bereits gesetzt war), False wenn der Workflow nicht existiert
         """
-        if not self.supabase.client:
-            return False
-            
         try:
+            now_iso = _utc_now_iso()
             update_data = {
                 'web_development_status': status,
-                'updated_at': datetime.now().isoformat()
+                'updated_at': now_iso,
+                **self._DEV_STATUS_PATCH.get(status, {})
             }
             
+            timestamp_column = self._DEV_STATUS_TIMESTAMP.get(status)
+            if timestamp_column:
+                update_data[timestamp_column] = now_iso
+            
             if notes:
                 update_data['web_development_notes'] = notes
             
-            if status == 'completed':
-                update_data['web_development_completed_at'] = datetime.now().isoformat()
-                update_data['current_stage'] = 'certification'  # Weiterleitung zur Zertifizierung
+            query = self.supabase.client.table('project_workflow')\
+                .update(update_data, count='exact', returning='minimal')\
+                .eq('id', workflow_id)
             
-            result = self.supabase.client.table('project_workflow')\
-                .update(update_data)\
-                .eq('id', workflow_id)\
-                .execute()
+            # Ohne Notizen ist ein Update auf den aktuellen Status ein No-op (z.B. Retries aus dem
+            # Frontend) - der Filter lässt Postgres die Zeile dann gar nicht erst schreiben
+            if not notes and status in self._DEV_STATUSES:
+                query = query.or_(f'web_development_status.is.null,web_development_status.neq.{status}')
             
-            success = result.data and len(result.data) > 0
-            if success:
-                logger.info(f"Entwicklungs-Status für Workflow {workflow_id} auf {status} aktualisiert")
-            else:
-                logger.error(f"Fehler beim Aktualisieren des Entwicklungs-Status: {result}")
+            if not query.execute().count and not self._workflow_exists(workflow_id):
+                logger.warning("Workflow %s nicht gefunden", workflow_id)
+                return False
             
-            return success
+            _invalidate_available_projects()
+            _invalidate_projects(workflow_id)
+            logger.info("Entwicklungs-Status für Workflow %s auf %s aktualisiert", workflow_id, status)
+            return True
             
         except Exception as e:
-            logger.error(f"Fehler beim Aktualisieren des Entwicklungs-Status: {str(e)}")
+            logger.error("Fehler beim Aktualisieren des Entwicklungs-Status: %s", e)
             return False
     
+    @requires_client(False)
     def update_certification_status(
         self, 
         workflow_id: str, 
@@ -263,103 +672,133 @@ class WorkflowService:
             notes: Optionale Notizen
             
         Returns:
-            True bei Erfolg
+            True bei Erfolg (auch wenn der Status bereits gesetzt war), False wenn der Workflow nicht existiert
         """
-        if not self.supabase.client:
-            return False
-            
         try:
+            now_iso = _utc_now_iso()
             update_data = {
                 'certification_status': status,
-                'updated_at': datetime.now().isoformat()
+                'updated_at': now_iso,
+                **self._CERT_STATUS_PATCH.get(status, {})
             }
             
+            timestamp_column = self._CERT_STATUS_TIMESTAMP.get(status)
+            if timestamp_column:
+                update_data[timestamp_column] = now_iso
+            
             if notes:
                 update_data['certification_notes'] = notes
             
-            if status == 'completed':
-                update_data['certification_completed_at'] = datetime.now().isoformat()
-                update_data['current_stage'] = 'completed'  # Projekt vollständig abgeschlossen
-            elif status == 'testing':
-                update_data['current_stage'] = 'certification'
+            query = self.supabase.client.table('project_workflow')\
+                .update(update_data, count='exact', returning='minimal')\
+                .eq('id', workflow_id)
             
-            result = self.supabase.client.table('project_workflow')\
-                .update(update_data)\
-                .eq('id', workflow_id)\
-                .execute()
+            if not notes and status in self._CERT_STATUSES:
+                query = query.or_(f'certification_status.is.null,certification_status.neq.{status}')
             
-            success = result.data and len(result.data) > 0
-            if success:
-                logger.info(f"Zertifizierungs-Status für Workflow {workflow_id} auf {status} aktualisiert")
-            else:
-                logger.error(f"Fehler beim Aktualisieren des Zertifizierungs-Status: {result}")
+            if not query.execute().count and not self._workflow_exists(workflow_id):
+                logger.warning("Workflow %s nicht gefunden", workflow_id)
+                return False
             
-            return success
+            _invalidate_available_projects()
+            _invalidate_projects(workflow_id)
+            logger.info("Zertifizierungs-Status für Workflow %s auf %s aktualisiert", workflow_id, status)
+            return True
             
         except Exception as e:
-            logger.error(f"Fehler beim Aktualisieren des Zertifizierungs-Status: {str(e)}")
+            logger.error("Fehler beim Aktualisieren des Zertifizierungs-Status: %s", e)
             return False
     
-    def get_projects_for_developer(self, developer_id: str) -> List[Dict[str, Any]]:
+    @requires_client(_empty_projects_page)
+    def get_projects_for_developer(
+        self,
+        developer_id: str,
+        expand: bool = True,
+        limit: int = PROJECTS_PAGE_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Holt alle Projekte eines Webentwicklers
+        Holt die Projekte eines Webentwicklers (neueste Änderung zuerst, seitenweise)
         
         Args:
             developer_id: Entwickler User ID
+            expand: Auftrag und Kundenprofil mitladen (False für Zähler/Status-Anzeigen ohne Joins)
+            limit: Maximale Anzahl Projekte pro Seite
+            cursor: next_cursor der vorherigen Seite (None für die erste Seite)
             
         Returns:
-            Liste von Projekten
+            Dict mit 'projects' und 'next_cursor' (None, wenn keine weitere Seite existiert)
         """
-        if not self.supabase.client:
-            return []
+        variant = (expand, limit, cursor)
+        cached = _get_cached_projects('developer', developer_id, variant)
+        if cached is not None:
+            return self._build_projects_page(cached, limit)
             
         try:
-            result = self.supabase.client.table('project_workflow')\
-                .select('''
-                    *,
-                    analysis_jobs(url, plan, status, created_at),
-                    customer_profile:user_profiles!customer_id(full_name, company)
-                ''')\
-                .eq('web_developer_id', developer_id)\
-                .order('updated_at', desc=True)\
-                .execute()
+            query = self.supabase.client.table('project_workflow')\
+                .select(DEVELOPER_LIST_SELECT if expand else WORKFLOW_LIST_COLUMNS)\
+                .eq('web_developer_id', developer_id)
+            
+            query = _apply_projects_cursor(query, cursor, limit)
+            result = _execute_deduplicated(('developer', developer_id) + variant, query)
             
-            return result.data or []
+            projects = result.data or []
+            _store_projects('developer', developer_id, variant, projects)
+            return self._build_projects_page(projects, limit)
             
         except Exception as e:
-            logger.error(f"Fehler beim Laden der Entwickler-Projekte: {str(e)}")
-            return []
+            logger.error("Fehler beim Laden der Entwickler-Projekte: %s", e)
+            return self._build_projects_page([], limit)
     
-    def get_projects_for_certifier(self, certifier_id: str) -> List[Dict[str, Any]]:
+    @requires_client(_empty_projects_page)
+    def get_projects_for_certifier(
+        self,
+        certifier_id: str,
+        expand: bool = True,
+        limit: int = PROJECTS_PAGE_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Holt alle Projekte eines Zertifizierers
+        Holt die Projekte eines Zertifizierers (neueste Änderung zuerst, seitenweise)
         
         Args:
             certifier_id: Zertifizierer User ID
+            expand: Auftrag, Kunden- und Entwicklerprofil mitladen (False für Zähler/Status-Anzeigen ohne Joins)
+            limit: Maximale Anzahl Projekte pro Seite
+            cursor: next_cursor der vorherigen Seite (None für die erste Seite)
             
         Returns:
-            Liste von Projekten
+            Dict mit 'projects' und 'next_cursor' (None, wenn keine weitere Seite existiert)
         """
-        if not self.supabase.client:
-            return []
+        variant = (expand, limit, cursor)
+        cached = _get_cached_projects('certifier', certifier_id, variant)
+        if cached is not None:
+            return self._build_projects_page(cached, limit)
             
         try:
-            result = self.supabase.client.table('project_workflow')\
-                .select('''
-                    *,
-                    analysis_jobs(url, plan, status, created_at),
-                    customer_profile:user_profiles!customer_id(full_name, company),
-                    web_developer_profile:user_profiles!web_developer_id(full_name, company)
-                ''')\
-                .eq('certifier_id', certifier_id)\
-                .order('updated_at', desc=True)\
-                .execute()
+            query = self.supabase.client.table('project_workflow')\
+                .select(CERTIFIER_LIST_SELECT if expand else WORKFLOW_LIST_COLUMNS)\
+                .eq('certifier_id', certifier_id)
+            
+            query = _apply_projects_cursor(query, cursor, limit)
+            result = _execute_deduplicated(('certifier', certifier_id) + variant, query)
             
-            return result.data or []
+            projects = result.data or []
+            _store_projects('certifier', certifier_id, variant, projects)
+            return self._build_projects_page(projects, limit)
             
         except Exception as e:
-            logger.error(f"Fehler beim Laden der Zertifizierer-Projekte: {str(e)}")
-            return []
+            logger.error("Fehler beim Laden der Zertifizierer-Projekte: %s", e)
+            return self._build_projects_page([], limit)
+    
+    @staticmethod
+    def _build_projects_page(projects: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+        """Setzt eine Seite von get_projects_for_* zusammen (Cursor = updated_at und id des letzten Projekts)"""
+        return {
+            # Liste kopieren - die Response wird ggf. mit parallelen Aufrufern geteilt
+            'projects': list(projects),
+            'next_cursor': _encode_projects_cursor(projects[-1]) if len(projects) == limit else None
+        }
     
     def send_message(
         self, 
@@ -386,34 +825,161 @@ class WorkflowService:
         Returns:
             True bei Erfolg
         """
-        if not self.supabase.client:
-            return False
+        return self.send_messages([MessagePayload(
+            workflow_id, sender_id, recipient_id, message_type, subject, message, attachments
+        )])
+    
+    @requires_client(False)
+    def send_messages(self, messages: List[Union[MessagePayload, Dict[str, Any]]]) -> bool:
+        """
+        Sendet mehrere Nachrichten in einem Insert (z.B. Benachrichtigung an alle Beteiligten)
+        
+        Args:
+            messages: Liste von MessagePayloads oder Dicts mit den Argumenten von send_message
+                (workflow_id, sender_id, recipient_id, message_type, subject, message, attachments)
+            
+        Returns:
+            True wenn alle Nachrichten gespeichert wurden
+        """
+        if not messages:
+            return True
             
         try:
-            message_data = {
-                'workflow_id': workflow_id,
-                'sender_id': sender_id,
-                'recipient_id': recipient_id,
-                'message_type': message_type,
-                'subject': subject,
-                'message': message,
-                'attachments': attachments or [],
-                'is_read': False,
-                'created_at': datetime.now().isoformat()
-            }
+            message_list = [
+                (msg if isinstance(msg, MessagePayload) else MessagePayload(**msg)).to_row()
+                for msg in messages
+            ]
             
             result = self.supabase.client.table('project_communications')\
-                .insert(message_data)\
+                .insert(message_list)\
                 .execute()
             
-            success = result.data and len(result.data) > 0
-            if success:
-                logger.info(f"Nachricht gesendet von {sender_id} an {recipient_id} für Workflow {workflow_id}")
-            else:
-                logger.error(f"Fehler beim Senden der Nachricht: {result}")
+            success = bool(result.data) and len(result.data) == len(message_list)
+            if success and logger.isEnabledFor(logging.INFO):
+                for msg in message_list:
+                    logger.info("Nachricht gesendet von %s an %s für Workflow %s", msg['sender_id'], msg['recipient_id'], msg['workflow_id'])
+            elif not success:
+                logger.error("Fehler beim Senden der Nachrichten: %s", result)
             
             return success
             
         except Exception as e:
-            logger.error(f"Fehler beim Senden der Nachricht: {str(e)}")
-            return False 
\ No newline at end of file
+            logger.error("Fehler beim Senden der Nachrichten: %s", e)
+            return False
+    
+    # Async-Varianten für FastAPI-Routen: der sync Supabase-Client (supabase-py 2.3) blockiert,
+    # daher läuft jeder Call in einem Worker-Thread statt im Event Loop
+    
+    async def create_project_workflow_async(
+        self, 
+        job_id: str, 
+        customer_id: str, 
+        web_development_requested: bool = False,
+        certification_requested: bool = False
+    ) -> Optional[str]:
+        """Async-Variante von create_project_workflow"""
+        return await _run_in_thread(
+            self.create_project_workflow, job_id, customer_id, web_development_requested, certification_requested
+        )
+    
+    async def get_available_projects_for_developer_async(
+        self,
+        expand: bool = True,
+        count_mode: Optional[str] = None
+    ) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], int]]:
+        """Async-Variante von get_available_projects_for_developer"""
+        return await _run_in_thread(self.get_available_projects_for_developer, expand, count_mode)
+    
+    async def get_available_projects_for_certifier_async(
+        self,
+        expand: bool = True,
+        count_mode: Optional[str] = None
+    ) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], int]]:
+        """Async-Variante von get_available_projects_for_certifier"""
+        return await _run_in_thread(self.get_available_projects_for_certifier, expand, count_mode)
+    
+    async def get_all_available_projects_async(self, expand: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """Async-Variante von get_all_available_projects - beide Listen werden parallel geladen"""
+        developer_projects, certifier_projects = await asyncio.gather(
+            _run_in_thread(self.get_available_projects_for_developer, expand),
+            _run_in_thread(self.get_available_projects_for_certifier, expand)
+        )
+        return {
+            'developer': developer_projects,
+            'certifier': certifier_projects
+        }
+    
+    async def assign_developer_to_project_async(self, workflow_id: str, developer_id: str) -> bool:
+        """Async-Variante von assign_developer_to_project"""
+        return await _run_in_thread(self.assign_developer_to_project, workflow_id, developer_id)
+    
+    async def assign_certifier_to_project_async(self, workflow_id: str, certifier_id: str) -> bool:
+        """Async-Variante von assign_certifier_to_project"""
+        return await _run_in_thread(self.assign_certifier_to_project, workflow_id, certifier_id)
+    
+    async def assign_developer_and_notify_async(
+        self, workflow_id: str, developer_id: str, sender_id: str, subject: str, message: str
+    ) -> bool:
+        """Async-Variante von assign_developer_and_notify"""
+        return await _run_in_thread(
+            self.assign_developer_and_notify, workflow_id, developer_id, sender_id, subject, message
+        )
+    
+    async def assign_certifier_and_notify_async(
+        self, workflow_id: str, certifier_id: str, sender_id: str, subject: str, message: str
+    ) -> bool:
+        """Async-Variante von assign_certifier_and_notify"""
+        return await _run_in_thread(
+            self.assign_certifier_and_notify, workflow_id, certifier_id, sender_id, subject, message
+        )
+    
+    async def update_development_status_async(
+        self, workflow_id: str, status: str, notes: Optional[str] = None
+    ) -> bool:
+        """Async-Variante von update_development_status"""
+        return await _run_in_thread(self.update_development_status, workflow_id, status, notes)
+    
+    async def update_certification_status_async(
+        self, workflow_id: str, status: str, notes: Optional[str] = None
+    ) -> bool:
+        """Async-Variante von update_certification_status"""
+        return await _run_in_thread(self.update_certification_status, workflow_id, status, notes)
+    
+    async def get_projects_for_developer_async(
+        self,
+        developer_id: str,
+        expand: bool = True,
+        limit: int = PROJECTS_PAGE_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Async-Variante von get_projects_for_developer"""
+        return await _run_in_thread(self.get_projects_for_developer, developer_id, expand, limit, cursor)
+    
+    async def get_projects_for_certifier_async(
+        self,
+        certifier_id: str,
+        expand: bool = True,
+        limit: int = PROJECTS_PAGE_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Async-Variante von get_projects_for_certifier"""
+        return await _run_in_thread(self.get_projects_for_certifier, certifier_id, expand, limit, cursor)
+    
+    async def send_message_async(
+        self, 
+        workflow_id: str, 
+        sender_id: str, 
+        recipient_id: str, 
+        message_type: str,
+        subject: str,
+        message: str,
+        attachments: Optional[List[str]] = None
+    ) -> bool:
+        """Async-Variante von send_message"""
+        return await _run_in_thread(
+            self.send_message, workflow_id, sender_id, recipient_id, message_type, subject, message, attachments
+        )
+    
+    async def send_messages_async(self, messages: List[Union[MessagePayload, Dict[str, Any]]]) -> bool:
+        """Async-Variante von send_messages"""
+        return await _run_in_thread(self.send_messages, messages)
@@ -0,0 +1,23 @@
+-- Migration: Deduplizierung von Stripe-Webhooks
+-- Datum: 2026-10-17
+-- Beschreibung: Verarbeitete Webhook-Event-IDs prozessübergreifend festhalten
+--               (Serverless/mehrere Worker teilen keinen Speicher)
+
+-- 1. Tabelle der verarbeiteten Events
+-- Der Primary Key auf event_id macht den Insert zum atomaren "Claim": eine zweite
+-- Zustellung desselben Events scheitert mit unique_violation (23505)
+CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+    event_id TEXT PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 2. Nur der Backend-Service (service_role) greift auf die Tabelle zu
+ALTER TABLE stripe_webhook_events ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access webhook events" ON stripe_webhook_events
+    FOR ALL USING (auth.role() = 'service_role');
+
+-- 3. Aufräumen: Stripe wiederholt Zustellungen höchstens 3 Tage lang, ältere Einträge
+-- können gelöscht werden (z.B. per pg_cron)
+-- DELETE FROM stripe_webhook_events WHERE created_at < now() - interval '7 days';
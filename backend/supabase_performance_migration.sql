@@ -0,0 +1,49 @@
+-- Migration: Performance-Optimierungen für Analyse-Tabellen
+-- Datum: 2026-10-17
+-- Beschreibung: Unique-Index für Upserts der Modul-Ergebnisse, finalize_job für den Job-Abschluss,
+--               Index für die Job-Liste pro User
+
+-- 1. Doppelte Modul-Ergebnisse bereinigen (neuester Eintrag bleibt erhalten)
+-- ROW_NUMBER statt Zeilenvergleich: Einträge ohne completed_at werden so ebenfalls erfasst
+-- (sortiert hinter alle abgeschlossenen), und PARTITION BY behandelt NULL-user_ids als gleich
+DELETE FROM analysis_results
+WHERE id IN (
+  SELECT id FROM (
+    SELECT id,
+           ROW_NUMBER() OVER (
+             PARTITION BY job_id, module_name, user_id
+             ORDER BY completed_at DESC NULLS LAST, id DESC
+           ) AS rn
+    FROM analysis_results
+  ) duplicates
+  WHERE rn > 1
+);
+
+-- 2. Unique-Index als Konfliktziel für upsert(on_conflict='job_id,module_name,user_id')
+-- NULLS NOT DISTINCT (ab PostgreSQL 15), damit auch Ergebnisse ohne user_id eindeutig sind
+CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_results_job_module_user
+    ON analysis_results(job_id, module_name, user_id) NULLS NOT DISTINCT;
+
+-- 3. Job-Abschluss in einem Request: finalen Bericht speichern und Status setzen (atomar)
+CREATE OR REPLACE FUNCTION finalize_job(p_job UUID, p_report JSONB)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    UPDATE analysis_jobs
+    SET result = p_report,
+        status = 'completed',
+        progress = 100,
+        completed_at = now(),
+        updated_at = now()
+    WHERE id = p_job;
+$$;
+
+-- 4. Index für get_user_jobs (eq user_id, order created_at desc, range)
+-- Ohne INCLUDE: USER_JOBS_COLUMNS enthält error und selected_upgrades, ein Index-Only-Scan
+-- wäre nur mit diesen (potenziell großen) Spalten im Index möglich. Die Seite wird über den
+-- Index gefunden und die wenigen Zeilen aus dem Heap gelesen.
+-- Lookups auf analysis_results(job_id, module_name) nutzen bereits den Unique-Index aus
+-- Schritt 2 (gleiche führende Spalten)
+DROP INDEX IF EXISTS idx_analysis_jobs_user_created;
+CREATE INDEX idx_analysis_jobs_user_created
+    ON analysis_jobs(user_id, created_at DESC);
@@ -0,0 +1,101 @@
+-- Migration: Performance-Optimierungen für Project Workflow
+-- Datum: 2026-10-17
+-- Beschreibung: Zuweisung + Benachrichtigung in einem Request (atomar),
+--               Partial-Indizes für die Listen verfügbarer Projekte, Zeitstempel-Defaults
+
+-- 1. Entwickler zuweisen und Benachrichtigung anlegen (eine Transaktion)
+-- Gibt die ID der Nachricht zurück, NULL wenn der Workflow nicht existiert
+CREATE OR REPLACE FUNCTION assign_developer_and_notify(
+    p_workflow_id UUID,
+    p_developer_id UUID,
+    p_sender_id UUID,
+    p_subject TEXT,
+    p_message TEXT
+)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_message_id UUID;
+BEGIN
+    UPDATE project_workflow
+    SET web_developer_id = p_developer_id,
+        web_development_status = 'assigned',
+        web_development_started_at = now(),
+        updated_at = now()
+    WHERE id = p_workflow_id;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO project_communications
+        (workflow_id, sender_id, recipient_id, message_type, subject, message, is_read, created_at)
+    VALUES
+        (p_workflow_id, p_sender_id, p_developer_id, 'status_update', p_subject, p_message, FALSE, now())
+    RETURNING id INTO v_message_id;
+
+    RETURN v_message_id;
+END;
+$$;
+
+-- 2. Zertifizierer zuweisen und Benachrichtigung anlegen (eine Transaktion)
+CREATE OR REPLACE FUNCTION assign_certifier_and_notify(
+    p_workflow_id UUID,
+    p_certifier_id UUID,
+    p_sender_id UUID,
+    p_subject TEXT,
+    p_message TEXT
+)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_message_id UUID;
+BEGIN
+    UPDATE project_workflow
+    SET certifier_id = p_certifier_id,
+        certification_status = 'assigned',
+        certification_started_at = now(),
+        current_stage = 'certification',
+        updated_at = now()
+    WHERE id = p_workflow_id;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO project_communications
+        (workflow_id, sender_id, recipient_id, message_type, subject, message, is_read, created_at)
+    VALUES
+        (p_workflow_id, p_sender_id, p_certifier_id, 'status_update', p_subject, p_message, FALSE, now())
+    RETURNING id INTO v_message_id;
+
+    RETURN v_message_id;
+END;
+$$;
+
+-- 3. Partial-Indizes für get_available_projects_for_developer/_certifier
+-- Enthalten nur offene, nicht zugewiesene Workflows und bleiben damit klein; die Sortierung
+-- nach created_at kommt direkt aus dem Index. Im Live-Betrieb ggf. einzeln mit
+-- CREATE INDEX CONCURRENTLY (außerhalb einer Transaktion) anlegen.
+CREATE INDEX IF NOT EXISTS idx_project_workflow_available_dev
+    ON project_workflow(created_at)
+    WHERE web_development_requested
+      AND web_developer_id IS NULL
+      AND web_development_status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_project_workflow_available_cert
+    ON project_workflow(created_at)
+    WHERE certification_requested
+      AND certifier_id IS NULL
+      AND certification_status = 'pending'
+      AND current_stage IN ('certification', 'web_development');
+
+-- 4. Zeitstempel beim Insert von der Datenbank setzen lassen (der Service sendet sie nicht mehr)
+ALTER TABLE project_workflow
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN updated_at SET DEFAULT now();
+
+ALTER TABLE project_communications
+    ALTER COLUMN created_at SET DEFAULT now();